@@ -0,0 +1,63 @@
+# coding: utf-8
+"""
+Bulk import: a million readings from text and binary data pushed
+into the stack with a view connected, then reduced with Σ, μ and σ.
+"""
+from __future__ import division
+
+import random
+import struct
+
+from common import measure, report, scale
+
+from procalc import bulk, operations
+from procalc.converters import Converter
+from procalc.stack import OpStack
+from procalc.view import StackView
+
+COUNT = scale(1000000)
+
+def readings(count):
+    rnd = random.Random(0)
+    return [round(rnd.lognormvariate(3, 0.25), 3) for i in xrange(count)]
+
+def new_stack(conv):
+    stack = OpStack(conv.parse, *operations.__ops__)
+    StackView(stack, conv.format, lambda: conv.formatter, limit=1000)
+    return stack
+
+def import_text(conv, lines):
+    stack = new_stack(conv)
+    bulk.push_text(stack, lines, conv.parse)
+
+def import_binary(conv, data):
+    stack = new_stack(conv)
+    bulk.push_binary(stack, data, 'float64')
+
+def push_one_by_one(conv, lines):
+    stack = new_stack(conv)
+    for line in lines:
+        stack.push(line)
+
+def reduce_list(conv, data, op):
+    stack = new_stack(conv)
+    stack.push('[‥]')
+    bulk.push_binary(stack, data, 'float64')
+    stack.push_op(op)
+    return stack.pop_op()
+
+def main():
+    conv = Converter()
+    values = readings(COUNT)
+    lines = ['%.3f' % x for x in values]
+    data = struct.pack('<%dd' % COUNT, *values)
+
+    one_by_one = lines[:max(COUNT // 100, 1)]
+    report('push one by one (text)', len(one_by_one), measure(push_one_by_one, conv, one_by_one))
+    report('bulk import text', COUNT, measure(import_text, conv, lines))
+    report('bulk import float64', COUNT, measure(import_binary, conv, data))
+    for op in ('Σ', 'μ', 'σ', 'gμ', 'med'):
+        report('bulk import float64 + %s' % op, COUNT, measure(reduce_list, conv, data, op))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# coding: utf-8
+"""
+Cost of big precision mode: parsing, arithmetic, transcendental
+functions and formatting with machine floats against Decimal numbers
+of 28, 100 and 1000 significant digits.
+"""
+from __future__ import division
+
+import random
+
+from common import measure, report, scale
+
+from procalc.converters import Converter
+from procalc import numeric
+
+COUNT = scale(10000)
+DIGITS = (0, 28, 100, 1000)
+
+def literals(count):
+    rnd = random.Random(0)
+    return ['%.15f' % rnd.uniform(0.1, 1000) for i in xrange(count)]
+
+def parse_all(conv, items):
+    conv.parse_cache.clear()
+    parse = conv.parse
+    return [parse(x) for x in items]
+
+def arith_all(items):
+    div, pow = numeric.div, numeric.pow
+    for x in items:
+        div(x * x + x, x - 1)
+        pow(x, 3)
+
+def func_all(func, items):
+    for x in items:
+        func(x)
+
+def format_all(conv, items):
+    format = conv.format
+    for x in items:
+        format(x)
+
+def main():
+    conv = Converter()
+    items = literals(COUNT)
+    for digits in DIGITS:
+        conv.digits = digits
+        # Transcendental functions are much slower with many digits
+        count = COUNT if digits < 1000 else max(COUNT // 100, 1)
+        name = 'digits %d' % digits if digits else 'float'
+
+        report('%s: parse' % name, COUNT, measure(parse_all, conv, items))
+        values = parse_all(conv, items)
+        report('%s: arithmetic' % name, COUNT, measure(arith_all, values))
+        for func in (numeric.sqrt, numeric.ln, numeric.sin):
+            report('%s: %s' % (name, func.__name__), count, measure(func_all, func, values[:count]))
+        report('%s: format' % name, COUNT, measure(format_all, conv, values))
+
+    conv.digits = 0
+
+if __name__ == '__main__':
+    main()
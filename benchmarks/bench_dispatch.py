@@ -0,0 +1,60 @@
+# coding: utf-8
+"""
+Operation dispatch: a million invocations of +, &, << and sin, with
+operations built the old way (argument list built per call, results
+inspected by op_invoke) and by the dispatch registry.
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc import operations
+from procalc.operations import OperationError, op_invoke
+from procalc.stack import OpStack
+
+COUNT = scale(1000000)
+
+OPERANDS = {
+        '+': (3, 5),
+        '&': (1234, 255),
+        '<<': (1, 4),
+        'sin': (0.5,),
+        }
+
+def list_operation(op):
+    '''
+    Operation as built before the dispatch registry
+    '''
+    rtypes = tuple(reversed(op.op_types))
+
+    def wrapper(stack):
+        try:
+            args = list()
+            for t in rtypes:
+                args.insert(0, t(stack.pop_op()))
+        except ValueError:
+            raise OperationError('Arguments type mismatch')
+
+        op_invoke(op.op_func, stack, args)
+
+    wrapper.op_name = op.op_name
+    wrapper.op_prio = op.op_prio
+    wrapper.op_asso = op.op_asso
+    return wrapper
+
+def invoke(stack, name, count):
+    program = stack.compile(list(OPERANDS[name]) + [name])
+    execute = stack.execute
+    for i in xrange(count):
+        execute(program)
+
+def main():
+    ops = [o for o in operations.__ops__ if o.op_name in OPERANDS]
+    old = OpStack(None, *map(list_operation, ops))
+    new = OpStack(None, *ops)
+    for name in ('+', '&', '<<', 'sin'):
+        report('%s: argument list + op_invoke' % name, COUNT, measure(invoke, old, name, COUNT))
+        report('%s: dispatch registry' % name, COUNT, measure(invoke, new, name, COUNT))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# coding: utf-8
+"""
+Constant folding: long infix chains entered operator by operator (as
+with the keypad), evaluated when = is pressed, without folding and
+with constant subexpressions folded as operators are pushed.
+"""
+from __future__ import division
+
+import random
+
+from common import measure, report, scale
+
+from procalc import operations
+from procalc.converters import Converter
+from procalc.stack import OpStack
+
+COUNT = scale(1000)
+
+# Tokens of one expression
+LENGTH = 200
+
+OPS = ('+', '−', '*', '/', '&', '|', '^')
+
+def chains(count):
+    rnd = random.Random(0)
+    for i in xrange(count):
+        tokens = [str(rnd.randint(1, 1000))]
+        for j in xrange(LENGTH // 2):
+            tokens.append(rnd.choice(OPS))
+            tokens.append(str(rnd.randint(1, 1000)))
+        yield tokens
+
+def enter(stack, expressions):
+    '''
+    Push tokens of every expression, return expressions pending
+    evaluation
+    '''
+    for tokens in expressions:
+        for token in tokens:
+            stack.push_op(token)
+        yield stack
+
+def evaluate(stack, expressions):
+    for pending in enter(stack, expressions):
+        pending.pop_op()
+
+def press_equals(stack, expressions):
+    '''
+    Time of = key presses only
+    '''
+    seconds = 0.0
+    for pending in enter(stack, expressions):
+        seconds += measure(pending.pop_op)
+    return seconds
+
+def main():
+    conv = Converter()
+    expressions = list(chains(COUNT))
+    for folding in (False, True):
+        name = 'folded' if folding else 'deferred'
+        stack = OpStack(conv.parse, *operations.__ops__)
+        stack.optimize(folding)
+        report('%s: enter and evaluate' % name, COUNT, measure(evaluate, stack, expressions))
+        report('%s: = key' % name, COUNT, press_equals(stack, expressions))
+        if folding:
+            print '%d operations folded, %d reused' % (stack.folded, stack.reused)
+
+if __name__ == '__main__':
+    main()
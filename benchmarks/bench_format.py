@@ -0,0 +1,42 @@
+# coding: utf-8
+"""
+Converter.format throughput for ints, floats and complex numbers
+in every view mode and base.
+"""
+from __future__ import division
+
+import random
+
+from common import measure, report, scale
+
+from procalc.converters import Converter
+
+COUNT = scale(100000)
+BASES = (2, 8, 10, 16)
+MODES = ('normal', 'raw', 'base exp')
+
+def values(count):
+    rnd = random.Random(0)
+    return (
+            ('int', [rnd.randint(-2 ** 40, 2 ** 40) for i in xrange(count)]),
+            ('float', [rnd.uniform(-1e6, 1e6) for i in xrange(count)]),
+            ('complex', [complex(rnd.uniform(-1e3, 1e3), rnd.uniform(-1e3, 1e3)) for i in xrange(count)]),
+            )
+
+def format_all(conv, items):
+    format = conv.format
+    for x in items:
+        format(x)
+
+def main():
+    conv = Converter()
+    conv.precision = (-1, 8)
+    for name, items in values(COUNT):
+        for mode, mode_name in enumerate(MODES):
+            conv.mode = mode
+            for base in BASES:
+                conv.base = base
+                report('format %s, %s, base %d' % (name, mode_name, base), COUNT, measure(format_all, conv, items))
+
+if __name__ == '__main__':
+    main()
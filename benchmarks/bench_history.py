@@ -0,0 +1,66 @@
+# coding: utf-8
+"""
+Undo history: cost of stack actions with snapshots recorded by
+History and with a copy of the stack taken per action, and of undo
+and redo, at stack depths from 1000 to 1000000 entries.
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc import operations
+from procalc.history import History
+from procalc.stack import OpStack
+
+COUNT = scale(100000)
+
+DEPTHS = (1000, 10000, 100000, 1000000)
+
+# Copies of deep stacks are slow, fewer actions are run with them to
+# copy about this many entries in total
+COPY_ENTRIES = 10 ** 7
+
+def new_stack(depth):
+    stack = OpStack(None, *operations.__ops__)
+    stack.extend(xrange(depth))
+    return stack
+
+def actions(stack, count):
+    '''
+    12 + x = over and over, every call changes the stack
+    '''
+    push, push_op, pop_op = stack.push, stack.push_op, stack.pop_op
+    for i in xrange(count // 4):
+        push(12)
+        push_op('+')
+        push(i)
+        pop_op()
+
+def copies(stack, count):
+    snapshots = list()
+    stack.connect(lambda changes: snapshots.append(stack.state()))
+    actions(stack, count)
+
+def undo_redo(history, count):
+    undo, redo = history.undo, history.redo
+    for i in xrange(count // 2):
+        undo()
+        undo()
+        redo()
+        redo()
+
+def main():
+    for depth in DEPTHS:
+        stack = new_stack(depth)
+        report('depth %d: actions' % depth, COUNT, measure(actions, stack, COUNT))
+
+        stack = new_stack(depth)
+        history = History(stack, COUNT)
+        report('depth %d: actions with history' % depth, COUNT, measure(actions, stack, COUNT))
+        report('depth %d: undo and redo' % depth, COUNT * 2, measure(undo_redo, history, COUNT))
+
+        count = min(max(COPY_ENTRIES // depth, 4), COUNT)
+        report('depth %d: actions with copies' % depth, count, measure(copies, new_stack(depth), count))
+
+if __name__ == '__main__':
+    main()
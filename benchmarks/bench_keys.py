@@ -0,0 +1,82 @@
+# coding: utf-8
+"""
+Keyboard input latency: replay a recorded key stream through key
+dispatch, with the dispatch table built for every key press (as it
+used to be) and built once at startup.
+
+Handlers only record input, so the numbers are dispatch overhead.
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc.keys import DEFAULT_BINDINGS, build_keymap
+
+COUNT = scale(1000000)
+
+# Key presses of a short session: 123 + 45 = * 6 = h 789 j (c)
+SESSION = u'qwe s rt = a y = h uio j c'
+
+class KeyEvent(object):
+    __slots__ = ('keyval',)
+
+    def __init__(self, char):
+        self.keyval = ord(char)
+
+class App(object):
+    '''
+    Headless application: key handlers record input
+    '''
+
+    def __init__(self):
+        self.input = []
+        self.is_mode = self.is_func = False
+
+    def key_insert(self, ch):
+        self.input.append(ch)
+
+    def key_operation(self, ch):
+        self.input.append(ch)
+
+    def key_toggle(self, attr):
+        setattr(self, attr, not getattr(self, attr))
+
+    def key_action(self, meth):
+        getattr(self, meth)(None)
+
+    def hit_clear(self, b):
+        del self.input[:]
+
+    hit_switch_sign = hit_push_stack = hit_pop_stack = hit_execute = hit_clear
+
+def key_stream(count):
+    events = [KeyEvent(c) for c in SESSION]
+    return (events * (count // len(events) + 1))[:count]
+
+def dispatch_rebuilt(app, events):
+    for ev in events:
+        keymap = build_keymap(app, DEFAULT_BINDINGS)
+        try:
+            action = keymap[ev.keyval]
+        except KeyError:
+            continue
+        action()
+
+def dispatch_prebuilt(app, events):
+    keymap = build_keymap(app, DEFAULT_BINDINGS)
+    for ev in events:
+        try:
+            action = keymap[ev.keyval]
+        except KeyError:
+            continue
+        action()
+
+def main():
+    app = App()
+    events = key_stream(COUNT)
+    rebuilt = events[:max(COUNT // 100, 1)]
+    report('keymap built per key press', len(rebuilt), measure(dispatch_rebuilt, app, rebuilt))
+    report('keymap built once', COUNT, measure(dispatch_prebuilt, app, events))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# coding: utf-8
+"""
+Memoization of pure operations: the same constant expressions
+evaluated over and over, with plain and memoized operations, for
+machine floats and for 50 digit decimals.
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc import numeric, operations
+from procalc.converters import Converter
+from procalc.memo import Memo
+from procalc.stack import OpStack
+
+COUNT = scale(100000)
+
+EXPRESSIONS = (
+        '1 << 31 | 0xFF',
+        'π * 2',
+        'sin 0.5 + cos 0.5',
+        )
+
+def evaluate(stack, count):
+    programs = [stack.compile(e.split()) for e in EXPRESSIONS]
+    execute = stack.execute
+    for i in xrange(count):
+        for program in programs:
+            execute(program)
+
+def main():
+    conv = Converter()
+    for digits in (0, 50):
+        conv.digits = digits
+        memo = Memo()
+        plain = OpStack(conv.parse, *operations.__ops__)
+        memoized = OpStack(conv.parse, *memo.ops(operations.__ops__))
+        count = COUNT if not digits else COUNT // 100
+
+        report('digits %d: plain operations' % digits, count, measure(evaluate, plain, count))
+        report('digits %d: memoized operations' % digits, count, measure(evaluate, memoized, count))
+        print 'digits %d: %d hits, %d misses' % (digits, memo.hits, memo.misses)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# coding: utf-8
+"""
+Sharded evaluation of an expressions file: one process against pools
+of 1, 2, 4, 8 and 16 worker processes.  Speedup is bounded by the
+number of CPU cores.
+"""
+from __future__ import with_statement
+from __future__ import division
+
+import os
+import random
+import tempfile
+import multiprocessing
+
+from common import measure, report, scale
+
+from procalc.batch import BatchEvaluator, configure, option_parser
+from procalc.converters import Converter
+from procalc.parallel import evaluate_file
+
+COUNT = scale(200000)
+JOBS = (1, 2, 4, 8, 16)
+
+class Sink(object):
+    def write(self, data):
+        pass
+
+def expressions(count):
+    rnd = random.Random(0)
+    for i in xrange(count):
+        yield '%d * %d + 0x%X & %d ↑ 2 − %d.5\n' % tuple(rnd.randint(1, 1000) for j in xrange(5))
+
+def serial(filename, options):
+    conv = Converter()
+    configure(conv, options)
+    with open(filename, 'rb') as f:
+        BatchEvaluator(conv, options.rpn).run(f, Sink(), filename)
+
+def main():
+    options, files = option_parser().parse_args([])
+    fd, filename = tempfile.mkstemp(suffix='.txt')
+    with os.fdopen(fd, 'wb') as f:
+        f.writelines(expressions(COUNT))
+
+    try:
+        print 'CPU cores: %d' % multiprocessing.cpu_count()
+        report('single process', COUNT, measure(serial, filename, options))
+        for jobs in JOBS:
+            report('%d workers' % jobs, COUNT, measure(evaluate_file, filename, options, jobs, Sink()))
+    finally:
+        os.unlink(filename)
+
+if __name__ == '__main__':
+    main()
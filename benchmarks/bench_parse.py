@@ -0,0 +1,54 @@
+# coding: utf-8
+"""
+Converter.parse throughput for different kinds of literals and for
+all of them mixed, both for unique literals (parse cache misses) and
+repeated ones (cache hits).
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc.converters import Converter, bin
+
+COUNT = scale(100000)
+LITERALS = (
+        ('decimal', '%d'),
+        ('fraction', '%d.125'),
+        ('hex', '0x%X'),
+        ('binary', '0b%s'),
+        ('exponent', '%de-3'),
+        ('complex', '%d.5-0x%Xj'),
+        )
+
+def literals(pattern, count):
+    if pattern == '0b%s':
+        return ['0b' + bin(i) for i in xrange(count)]
+    if pattern.count('%') == 2:
+        return [pattern % (i, i) for i in xrange(count)]
+    return [pattern % i for i in xrange(count)]
+
+def parse_all(conv, items):
+    parse = conv.parse
+    for s in items:
+        parse(s)
+
+def mixed(count):
+    kinds = [literals(pattern, count // len(LITERALS) + 1) for name, pattern in LITERALS]
+    return [s for group in zip(*kinds) for s in group][:count]
+
+def main():
+    for name, pattern in LITERALS + (('mixed', None),):
+        if pattern is None:
+            items = mixed(COUNT)
+        else:
+            items = literals(pattern, COUNT)
+
+        conv = Converter()
+        report('parse %s, unique' % name, COUNT, measure(parse_all, conv, items))
+
+        conv = Converter()
+        items = items[:100] * (COUNT // 100)
+        report('parse %s, repeated' % name, COUNT, measure(parse_all, conv, items))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# coding: utf-8
+"""
+Evaluating one formula against many inputs: shunting-yard on every
+evaluation vs. a program compiled once and executed many times.
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc import operations
+from procalc.stack import OpStack
+
+COUNT = scale(100000)
+FORMULA = 'x * 3 + x ↑ 2 − 1 << 4 & 255'.split()
+
+def shunting_yard(stack, count):
+    push_op, pop_op = stack.push_op, stack.pop_op
+    for x in xrange(count):
+        for token in FORMULA:
+            push_op(x if token == 'x' else token)
+        pop_op()
+
+def compiled(stack, count):
+    program = stack.compile(FORMULA, ('x',))
+    execute = stack.execute
+    for x in xrange(count):
+        execute(program, dict(x=x))
+
+def main():
+    stack = OpStack(int, *operations.__ops__)
+    report('shunting-yard per evaluation', COUNT, measure(shunting_yard, stack, COUNT))
+    report('compiled program', COUNT, measure(compiled, stack, COUNT))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+# coding: utf-8
+"""
+Decimal conversion of huge integers (powers of 3 with 10k, 100k and
+1M digits): converter format and parse against built-in '%d' and
+int().  Shorter numbers are converted more times, so every size takes
+about the same number of digits converted.  Power tables are built by
+the first conversion, which is not timed.
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc.converters import Converter
+
+DIGITS = (10000, 100000, 1000000)
+
+def repeat(func, arg, count):
+    for i in xrange(count):
+        func(arg)
+
+def main():
+    conv = Converter()
+    for digits in sorted(set(scale(d) for d in DIGITS)):
+        count = max(scale(DIGITS[-1]) // digits, 1)
+        n = 3 ** int(digits / 0.47712125472)
+        text = '%d' % n
+        conv.format(n)
+
+        report('%d digits: format' % digits, count, measure(repeat, conv.format, n, count))
+        report('%d digits: %%d' % digits, count, measure(repeat, '%d'.__mod__, n, count))
+
+        # parse() caches parsed literals, _parse() converts every time
+        report('%d digits: parse' % digits, count, measure(repeat, conv._parse, text, count))
+        report('%d digits: int()' % digits, count, measure(repeat, int, text, count))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# coding: utf-8
+"""
+List reducers over a million values already on the stack.
+"""
+from __future__ import division
+
+import random
+
+from common import measure, report, scale
+
+from procalc import operations
+from procalc.stack import OpStack
+
+COUNT = scale(1000000)
+REDUCERS = ('Σ', 'Π', 'μ', 'gμ', 'σ', 'min', 'max', 'med')
+
+def values(count):
+    rnd = random.Random(0)
+    return [rnd.uniform(0.999, 1.001) for i in xrange(count)]
+
+def reduce_list(stack, entries, op):
+    stack.clear()
+    stack.restore(entries)
+    stack.push_op(op)
+    return stack.pop_op()
+
+def main():
+    entries = [operations.nan] + values(COUNT)
+    stack = OpStack(None, *operations.__ops__)
+    for op in REDUCERS:
+        report('reduce %s' % op, COUNT, measure(reduce_list, stack, entries, op))
+    report('reduce pct', COUNT, measure(reduce_list, stack, [50] + entries, 'pct'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# coding: utf-8
+"""
+Calculator service under load: 1 to 1000 concurrent clients evaluate
+expressions with pipelined requests against a server running in its
+own process.  Throughput is in requests per second, latency of every
+request is timed from sending it to reading its response.
+"""
+from __future__ import division
+
+import os
+import sys
+import time
+import json
+import socket
+import shutil
+import asyncore
+import asynchat
+import tempfile
+import subprocess
+from collections import deque
+
+from common import report, scale
+
+COUNT = scale(20000)
+
+CLIENTS = (1, 10, 100, 1000)
+
+# Requests a client has in flight
+DEPTH = 8
+
+def requests(count):
+    '''
+    Request lines of one client: 12 + x evaluated over and over
+    '''
+    lines = list()
+    for i in xrange(count):
+        cmd, arg = (('push', '12'), ('push_op', '+'), ('push', str(i)), ('pop_op', None))[i % 4]
+        lines.append(json.dumps(dict(id=i, cmd=cmd, arg=arg)) + '\n')
+    return lines
+
+class Client(asynchat.async_chat):
+
+    def __init__(self, path, lines, latencies, map_):
+        asynchat.async_chat.__init__(self, map=map_)
+        self.set_terminator('\n')
+        self.lines = deque(lines)
+        self.sent = deque()
+        self.latencies = latencies
+        self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connect(path)
+        for i in xrange(DEPTH):
+            self.send_next()
+
+    def send_next(self):
+        if self.lines:
+            self.sent.append(time.time())
+            self.push(self.lines.popleft())
+
+    def handle_connect(self):
+        pass
+
+    def collect_incoming_data(self, data):
+        pass
+
+    def found_terminator(self):
+        self.latencies.append(time.time() - self.sent.popleft())
+        if self.lines:
+            self.send_next()
+        elif not self.sent:
+            self.close()
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+def run(path, clients, count):
+    map_ = dict()
+    latencies = list()
+    per_client = max(count // clients, 1)
+    lines = requests(per_client)
+
+    start = time.time()
+    for i in xrange(clients):
+        Client(path, lines, latencies, map_)
+    asyncore.loop(map=map_, use_poll=True)
+    elapsed = time.time() - start
+
+    if len(latencies) != clients * per_client:
+        raise RuntimeError('%d of %d responses' % (len(latencies), clients * per_client))
+    return len(latencies), elapsed, latencies
+
+def start_server(path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen([sys.executable, '-m', 'procalc.server', path], cwd=root)
+    while not os.path.exists(path):
+        if server.poll() is not None:
+            raise RuntimeError('server exited with status %d' % server.returncode)
+        time.sleep(0.01)
+    return server
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, 'procalc.sock')
+    server = start_server(path)
+    try:
+        for clients in CLIENTS:
+            count, elapsed, latencies = run(path, clients, COUNT)
+            report('%d clients' % clients, count, elapsed)
+            print '%-40s %10.3f ms' % ('%d clients: p99 latency' % clients, percentile(latencies, 99) * 1000)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# coding: utf-8
+"""
+Session restore: binary stack snapshot save/load against re-parsing
+the stack from text, for floats, ints and mixed entries.
+"""
+from __future__ import division
+
+import os
+import random
+import tempfile
+
+from common import measure, report, scale
+
+from procalc import operations, snapshot
+from procalc.converters import Converter
+from procalc.stack import OpStack
+
+COUNT = scale(500000)
+
+def entries(count):
+    rnd = random.Random(0)
+    return (
+            ('float', [rnd.uniform(-1e6, 1e6) for i in xrange(count)]),
+            ('int', [rnd.randint(-2 ** 40, 2 ** 40) for i in xrange(count)]),
+            ('mixed', [rnd.choice((rnd.random(), rnd.randint(0, 100), 2 ** 70, 1j, operations.nan)) for i in xrange(count)]),
+            )
+
+def new_stack(conv):
+    return OpStack(conv.parse, *operations.__ops__)
+
+def parse_all(conv, lines):
+    stack = new_stack(conv)
+    conv.parse_cache.clear()
+    for line in lines:
+        stack.push(line)
+
+def main():
+    conv = Converter()
+    filename = os.path.join(tempfile.mkdtemp(), 'session.bin')
+    for name, items in entries(COUNT):
+        stack = new_stack(conv)
+        stack.restore(items)
+
+        report('%s: snapshot save' % name, COUNT, measure(snapshot.save, stack, filename))
+        report('%s: snapshot load' % name, COUNT, measure(snapshot.load, new_stack(conv), filename))
+        if name == 'int':
+            words = Converter()
+            words.word = 'int32'
+            report('%s: snapshot load, int32 words' % name, COUNT,
+                    measure(snapshot.load, new_stack(words), filename, words.wrap))
+
+        if name != 'mixed':
+            lines = [conv.format(x) for x in items]
+            report('%s: parse from text' % name, COUNT, measure(parse_all, conv, lines))
+
+    os.unlink(filename)
+    os.rmdir(os.path.dirname(filename))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# coding: utf-8
+"""
+OpStack throughput near the top of the stack at different stack depths.
+
+Every operation must cost the same regardless of how many values
+lie below the top of the stack.
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc import operations
+from procalc.stack import OpStack
+
+DEPTHS = (10, 10000, 1000000)
+COUNT = scale(100000)
+
+def prefilled(depth):
+    stack = OpStack(None, *operations.__ops__)
+    for i in xrange(depth):
+        stack.push(i)
+    return stack
+
+def push_pop(stack, count):
+    push, pop = stack.push, stack.pop
+    for i in xrange(count):
+        push(i)
+        pop()
+
+def push_op_pop_op(stack, count):
+    push_op, pop_op = stack.push_op, stack.pop_op
+    for i in xrange(count):
+        push_op(i)
+        push_op('+')
+        push_op(1)
+        pop_op()
+
+def main():
+    for depth in DEPTHS:
+        stack = prefilled(depth)
+        report('push+pop @ depth %d' % depth, COUNT, measure(push_pop, stack, COUNT))
+        report('push_op+pop_op @ depth %d' % depth, COUNT, measure(push_op_pop_op, stack, COUNT))
+
+if __name__ == '__main__':
+    main()
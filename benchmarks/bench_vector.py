@@ -0,0 +1,40 @@
+# coding: utf-8
+"""
+One formula over many values: a loop of scalar evaluations vs. a single
+evaluation in array mode.  Requires NumPy.
+"""
+from __future__ import division
+
+import numpy
+
+from common import measure, report
+
+from procalc import operations, vector
+from procalc.converters import Converter
+from procalc.stack import OpStack
+
+SIZE = 1000000
+FORMULA = 'x * 3 + x ↑ 2 − 1 << 4 & 255'.split()
+
+def scalar(stack, values):
+    program = stack.compile(FORMULA, ('x',))
+    execute = stack.execute
+    for x in values:
+        execute(program, dict(x=x))
+
+def vectorized(stack, values):
+    stack.execute(stack.compile(FORMULA, ('x',)), dict(x=values))
+
+def main():
+    conv = Converter()
+    values = numpy.arange(SIZE)
+
+    stack = OpStack(conv.parse, *operations.__ops__)
+    count = SIZE // 100
+    report('scalar loop', count, measure(scalar, stack, values[:count].tolist()))
+
+    stack = OpStack(vector.guard(conv.parse), *(operations.__ops__ + vector.__ops__))
+    report('array mode', SIZE, measure(vectorized, stack, values))
+
+if __name__ == '__main__':
+    main()
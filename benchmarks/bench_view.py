@@ -0,0 +1,48 @@
+# coding: utf-8
+"""
+Stack view update cost per action at different stack depths:
+incremental view patching against full as_str() rebuild.
+"""
+from __future__ import division
+
+from common import measure, report, scale
+
+from procalc import operations
+from procalc.converters import Converter
+from procalc.stack import OpStack
+from procalc.view import StackView
+
+DEPTHS = (10, 1000, 100000)
+COUNT = scale(1000)
+
+def prefilled(conv, depth):
+    stack = OpStack(conv.parse, *operations.__ops__)
+    for i in xrange(depth):
+        stack.push(i * 0.5)
+    return stack
+
+def actions(stack, count, update):
+    for i in xrange(count):
+        stack.push(i)
+        update()
+        stack.push_op('+')
+        update()
+        stack.push_op(1)
+        update()
+        stack.pop_op()
+        update()
+
+def main():
+    conv = Converter()
+    for depth in DEPTHS:
+        stack = prefilled(conv, depth)
+        count = COUNT if depth < 100000 else max(COUNT // 100, 1)
+        report('as_str rebuild @ depth %d' % depth, count * 4,
+                measure(actions, stack, count, lambda: stack.as_str(conv.format)))
+
+        view = StackView(stack, conv.format, lambda: conv.formatter)
+        report('incremental view @ depth %d' % depth, COUNT * 4,
+                measure(actions, stack, COUNT, view.refresh))
+
+if __name__ == '__main__':
+    main()
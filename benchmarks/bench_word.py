@@ -0,0 +1,63 @@
+# coding: utf-8
+"""
+Fixed width integers: wrapping to 32 bit words with struct round trips
+(the way converters.raw does it) and with precomputed masks, raw
+formatting of negative integers, and masked arithmetic on the stack.
+"""
+from __future__ import division
+
+import random
+
+from common import measure, report, scale
+
+from procalc import operations
+from procalc.converters import Converter, repack, raw
+from procalc.stack import OpStack
+from procalc.word import word_for
+
+COUNT = scale(1000000)
+
+def values(count):
+    rnd = random.Random(0)
+    return [rnd.randint(-2 ** 40, 2 ** 40) for i in xrange(count)]
+
+def wrap_repack(items):
+    for x in items:
+        repack(x & 0xFFFFFFFF, 'I', 'i')
+
+def wrap_mask(items):
+    wrap = word_for('int32').wrap
+    for x in items:
+        wrap(x)
+
+def format_all(format, items):
+    for x in items:
+        format(x)
+
+def masked_arithmetic(conv, items):
+    stack = OpStack(conv.parse, *operations.__ops__)
+    program = stack.compile('x * 3 + 7 << 4 ^ x'.split(), ('x',))
+    execute = stack.execute
+    for x in items:
+        execute(program, dict(x=x))
+
+def main():
+    items = values(COUNT)
+    report('int32 wrap: struct repack', COUNT, measure(wrap_repack, items))
+    report('int32 wrap: precomputed mask', COUNT, measure(wrap_mask, items))
+
+    conv = Converter()
+    conv.mode, conv.base = 1, 16
+    negative = [-abs(x) for x in items]
+    report('raw hex: struct repack', COUNT, measure(format_all, lambda x: '%X' % raw(x), negative))
+    conv.word = 'int64'
+    report('raw hex: int64 word formatter', COUNT, measure(format_all, conv.format, negative))
+
+    conv = Converter()
+    arithmetic = items[:COUNT // 10]
+    report('stack arithmetic: unbounded', len(arithmetic), measure(masked_arithmetic, conv, arithmetic))
+    conv.word = 'int32'
+    report('stack arithmetic: int32 words', len(arithmetic), measure(masked_arithmetic, conv, arithmetic))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# coding: utf-8
+"""
+Shared helpers for procalc benchmarks.
+
+Benchmarks are plain scripts, run them from the source tree root:
+
+    python benchmarks/bench_stack.py
+
+An optional argument overrides the default number of operations.
+PROCALC_BENCH_SCALE environment variable scales default numbers of
+operations, with PROCALC_BENCH_OUTPUT set every result is also
+appended to the named file as a JSON line (see run.py).
+"""
+
+from __future__ import with_statement
+
+import os
+import sys
+import time
+
+SCALE_ENV = 'PROCALC_BENCH_SCALE'
+OUTPUT_ENV = 'PROCALC_BENCH_OUTPUT'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def scale(default):
+    '''
+    Number of operations to run: the first command line argument
+    if any, otherwise the default.
+    '''
+    if len(sys.argv) > 1:
+        return int(sys.argv[1])
+    return max(int(default * float(os.environ.get(SCALE_ENV) or 1)), 1)
+
+def measure(func, *args):
+    '''
+    Call func(*args) once, return wall clock time it took in seconds.
+    '''
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+def report(name, count, seconds):
+    '''
+    Print one result line: benchmark name, number of operations
+    performed, total time and throughput.
+    '''
+    rate = count / seconds if seconds else float('inf')
+    print '%-40s %10d ops %10.4f s %14.1f ops/s' % (name, count, seconds, rate)
+
+    output = os.environ.get(OUTPUT_ENV)
+    if output:
+        # json is not available in Python 2.5, run.py sets output only
+        # if it is
+        import json
+        benchmark = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        with open(output, 'ab') as f:
+            f.write(json.dumps(dict(benchmark=benchmark, name=name, count=count,
+                seconds=seconds, rate=rate if seconds else None)) + '\n')
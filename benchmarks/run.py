@@ -0,0 +1,131 @@
+# coding: utf-8
+"""
+Run benchmarks and save machine readable results.
+
+    python benchmarks/run.py [options] [bench_name ...]
+
+Every benchmark script runs in its own process.  Results are saved as
+JSON: revision, Python version, scale and a list of results (benchmark
+script, name, count, seconds, rate).  Given results of another revision
+(--compare), throughput changes are printed for every benchmark found
+in both.
+"""
+from __future__ import with_statement
+from __future__ import division
+
+import os
+import sys
+import glob
+import tempfile
+import platform
+import subprocess
+from optparse import OptionParser
+
+from common import OUTPUT_ENV, SCALE_ENV
+
+# Results are collected, saved and compared only with json module,
+# which is not available in Python 2.5
+try:
+    import json
+except ImportError:
+    json = None
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def benchmarks(names=()):
+    scripts = sorted(glob.glob(os.path.join(BENCHMARKS_DIR, 'bench_*.py')))
+    if names:
+        scripts = [s for s in scripts if os.path.basename(s)[:-3] in names]
+    return scripts
+
+def revision():
+    try:
+        process = subprocess.Popen(['git', 'describe', '--always', '--dirty'],
+                cwd=BENCHMARKS_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = process.communicate()[0].strip()
+        if process.returncode == 0:
+            return output
+    except OSError:
+        pass
+    return None
+
+def run(scripts, scale=1.0, output=sys.stdout):
+    '''
+    Run benchmark scripts, return results and names of failed scripts.
+    Without json module results are only printed.
+    '''
+    fd, filename = tempfile.mkstemp(prefix='procalc-bench', suffix='.jsonl')
+    os.close(fd)
+
+    env = dict(os.environ)
+    if json is not None:
+        env[OUTPUT_ENV] = filename
+    env[SCALE_ENV] = str(scale)
+
+    failed = list()
+    try:
+        for script in scripts:
+            name = os.path.basename(script)[:-3]
+            output.write('# %s\n' % name)
+            output.flush()
+            if subprocess.call([sys.executable, script], env=env, stdout=output):
+                failed.append(name)
+
+        results = list()
+        if json is not None:
+            with open(filename, 'rb') as f:
+                results = [json.loads(line) for line in f if line.strip()]
+    finally:
+        os.unlink(filename)
+
+    return results, failed
+
+def compare(old, new, output=sys.stdout):
+    '''
+    Print throughput change of every benchmark found in both results
+    '''
+    rates = dict(((r['benchmark'], r['name']), r['rate']) for r in old['results'])
+    output.write('%-60s %14s %14s %8s\n' % ('benchmark', old.get('revision') or 'old', new.get('revision') or 'new', 'change'))
+    for r in new['results']:
+        key = (r['benchmark'], r['name'])
+        before, after = rates.get(key), r['rate']
+        if not before or not after:
+            continue
+        output.write('%-60s %14.1f %14.1f %+7.1f%%\n' % (
+            ('%s: %s' % key).encode('utf-8'), before, after, (after / before - 1) * 100))
+
+def main(argv):
+    parser = OptionParser(usage='%prog [options] [bench_name ...]')
+    parser.add_option('-o', '--output', help='save results to FILE (JSON)', metavar='FILE')
+    parser.add_option('-s', '--scale', type='float', default=1.0,
+            help='scale default numbers of operations, e.g. 0.1 for a quick run')
+    parser.add_option('-c', '--compare', help='compare with results saved to FILE', metavar='FILE')
+    options, names = parser.parse_args(argv)
+    if json is None and (options.output or options.compare):
+        parser.error('saving and comparing results needs Python 2.6 or newer')
+
+    scripts = benchmarks(names)
+    results, failed = run(scripts, options.scale)
+    data = dict(
+            revision=revision(),
+            python=platform.python_version(),
+            scale=options.scale,
+            results=results,
+            failed=failed,
+            )
+
+    if options.output:
+        with open(options.output, 'wb') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare, 'rb') as f:
+            compare(json.load(f), data)
+
+    if failed:
+        sys.stderr.write('failed: %s\n' % ', '.join(failed))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
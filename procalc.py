@@ -2,12 +2,18 @@
 # coding: utf-8
 
 import sys
-from procalc.main import ProCalcApp
+import time
+
+started = time.time()
 
 if __name__ == '__main__':
-    app = ProCalcApp()
+    if len(sys.argv) > 1:
+        from procalc.batch import main
+        sys.exit(main(sys.argv[1:]))
+
+    from procalc.main import ProCalcApp
+    app = ProCalcApp(started)
     try:
         app.run()
     except KeyboardInterrupt:
         sys.exit(2)
-
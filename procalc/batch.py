@@ -0,0 +1,223 @@
+# coding: utf-8
+"""
+Headless batch evaluation: read expressions line by line from files
+or standard input, evaluate them and print formatted results.
+"""
+from __future__ import division
+
+import sys
+import time
+from optparse import OptionParser
+
+from procalc import operations
+from procalc.i18n import _
+from procalc.stack import OpStack, StackError
+from procalc.converters import Converter
+from procalc.config import Config
+from procalc.memo import Memo
+from procalc.instrument import Profiler, profile_file
+from procalc.word import WORD_NAMES
+
+# ASCII spellings of operations for command line users
+ALIASES = {
+        '-': '−',
+        '\\': '↑',
+        'pi': 'π',
+        '[..]': '[‥]',
+        }
+
+def tokenize(line):
+    return [ALIASES.get(t, t) for t in line.split()]
+
+def evaluate(stack, tokens, rpn=False):
+    '''
+    Evaluate a sequence of tokens on a clean stack, return result.
+    In RPN mode every operation is applied as soon as it is read,
+    otherwise tokens are treated as an infix expression.
+    '''
+    stack.clear()
+
+    if rpn:
+        for token in tokens:
+            stack.push(token)
+            if stack.has_op(token):
+                stack.push(stack.pop_op())
+
+    else:
+        for token in tokens:
+            stack.push_op(token)
+
+    return stack.pop_op()
+
+class BatchEvaluator(object):
+
+    def __init__(self, conv, rpn=False, memo=None, fold=False):
+        self.conv = conv
+        ops = operations.__ops__
+        if memo is not None:
+            ops = memo.ops(ops)
+        self.stack = OpStack(conv.parse, *ops)
+        self.stack.optimize(fold)
+        self.rpn = rpn
+        # Base of results without numbers in autobase mode, so that
+        # every line is formatted the same no matter what was before
+        self.base = conv.realbase()
+        self.count = 0
+        self.errors = 0
+
+    def run(self, lines, output, name='-'):
+        '''
+        Evaluate every line from lines and write one line of output
+        per line of input, errors are reported with error().
+        Return number of lines read.
+
+        >>> import sys
+        >>> evaluator = BatchEvaluator(Converter())
+        >>> evaluator.error = lambda name, lineno, message: sys.stdout.write('%d: error\\n' % lineno)
+        >>> evaluator.run(['1 + 1', '1j & 3', '2 / 0', '2 + 2'], sys.stdout)
+        2
+        2: error
+        <BLANKLINE>
+        3: error
+        <BLANKLINE>
+        4
+        4
+        >>> evaluator.count, evaluator.errors
+        (4, 2)
+
+        In autobase mode a line without numbers does not take base from
+        the line before, so lines can be evaluated in any order:
+
+        >>> from StringIO import StringIO
+        >>> evaluator.conv.base = -1
+        >>> evaluator.run(['0x10 | 0x1', 'pi'], StringIO())
+        2
+        >>> evaluator.conv.realbase()
+        10
+        '''
+        write = output.write
+        reset_base = self.conv.reset_base
+        lineno = 0
+        for line in lines:
+            lineno += 1
+            tokens = tokenize(line)
+            if not tokens:
+                write('\n')
+                continue
+
+            self.count += 1
+            reset_base(self.base)
+            try:
+                write(self.conv.format(evaluate(self.stack, tokens, self.rpn)) + '\n')
+
+            except (StackError, ValueError, ArithmeticError, TypeError), e:
+                self.errors += 1
+                self.error(name, lineno, unicode(e.message).encode('utf-8'))
+                write('\n')
+
+        return lineno
+
+    def error(self, name, lineno, message):
+        sys.stderr.write('%s:%d: %s\n' % (name, lineno, message))
+
+def configure(conv, options):
+    conv.precision = options.precision.split(':')
+    conv.mode = options.mode
+    conv.base = options.base
+    conv.digits = options.digits
+    conv.word = options.word
+
+def option_parser():
+    config = Config()
+    config.load()
+
+    parser = OptionParser(usage=_(u'%prog [options] [file ...]').encode('utf-8'))
+    parser.add_option('-b', '--batch', action='store_true', default=False,
+            help=_(u'evaluate expressions without GUI').encode('utf-8'))
+    parser.add_option('-r', '--rpn', action='store_true', default=False,
+            help=_(u'read expressions in reverse polish notation').encode('utf-8'))
+    parser.add_option('-B', '--base', type='int', default=int(config['base']),
+            help=_(u'output base: 2, 8, 10, 16 or -1 for auto').encode('utf-8'))
+    parser.add_option('-m', '--mode', type='int', default=int(config['view_mode']),
+            help=_(u'view mode: 0 normal, 1 raw, 2 base exp').encode('utf-8'))
+    parser.add_option('-p', '--precision', default=config['precision'],
+            help=_(u'precision as LENGTH:DECIMALS').encode('utf-8'))
+    parser.add_option('-d', '--digits', type='int', default=int(config['digits']),
+            help=_(u'significant digits of real numbers, 0 for machine floats').encode('utf-8'))
+    parser.add_option('-w', '--word', type='choice', choices=('',) + WORD_NAMES, default=config['word'],
+            help=_(u'fixed width integers: int8 .. int128, uint8 .. uint128').encode('utf-8'))
+    parser.add_option('-M', '--memo', type='int', default=0, metavar='SIZE',
+            help=_(u'cache up to SIZE results of operations').encode('utf-8'))
+    parser.add_option('-F', '--fold', action='store_true', default=False,
+            help=_(u'fold constant subexpressions of infix expressions').encode('utf-8'))
+    parser.add_option('-j', '--jobs', type='int', default=1,
+            help=_(u'evaluate files in JOBS worker processes').encode('utf-8'))
+    parser.add_option('-S', '--serve', metavar='SOCKET',
+            help=_(u'serve calculator sessions on Unix SOCKET').encode('utf-8'))
+    parser.add_option('-q', '--quiet', action='store_true', default=False,
+            help=_(u'do not report throughput').encode('utf-8'))
+    return parser
+
+def main(argv):
+    parser = option_parser()
+    options, files = parser.parse_args(argv)
+
+    if options.jobs > 1:
+        # multiprocessing is not available in Python 2.5
+        try:
+            from procalc.parallel import evaluate_file
+        except ImportError:
+            parser.error(_(u'worker processes need Python 2.6 or newer').encode('utf-8'))
+
+    if options.serve:
+        # json is not available in Python 2.5
+        try:
+            from procalc.server import serve
+        except ImportError:
+            parser.error(_(u'calculator service needs Python 2.6 or newer').encode('utf-8'))
+        serve(options.serve, options)
+        return 0
+
+    profile = profile_file()
+    profiler = Profiler()
+
+    conv = Converter()
+    if profile:
+        conv.instrument(profiler)
+    configure(conv, options)
+    memo = None
+    if options.memo:
+        memo = Memo(options.memo)
+    evaluator = BatchEvaluator(conv, options.rpn, memo, options.fold)
+    if profile:
+        evaluator.stack.instrument(profiler)
+
+    start = time.time()
+    for name in files or ['-']:
+        if name == '-':
+            evaluator.run(sys.stdin, sys.stdout, name)
+        elif options.jobs > 1:
+            count, errors = evaluate_file(name, options, options.jobs, sys.stdout)
+            evaluator.count += count
+            evaluator.errors += errors
+        else:
+            f = open(name, 'rb')
+            try:
+                evaluator.run(f, sys.stdout, name)
+            finally:
+                f.close()
+    elapsed = time.time() - start
+
+    if not options.quiet:
+        sys.stderr.write('%d expressions, %d errors in %.3f s (%.1f expr/s)\n' % (
+            evaluator.count, evaluator.errors, elapsed,
+            evaluator.count / elapsed if elapsed else 0.0))
+        if memo is not None:
+            sys.stderr.write('%d cache hits, %d misses\n' % (memo.hits, memo.misses))
+        if options.fold:
+            sys.stderr.write('%d operations folded, %d reused\n' % (evaluator.stack.folded, evaluator.stack.reused))
+
+    if profile:
+        profiler.dump(profile)
+
+    return evaluator.errors and 1 or 0
@@ -0,0 +1,135 @@
+# coding: utf-8
+"""
+Bulk import of numbers into the stack.
+
+Numbers are read from text (CSV or one number per line) or from raw
+binary buffers of fixed size integers and floats, and pushed into the
+stack in one batch, so stack listeners are notified once:
+
+>>> from procalc.converters import Converter
+>>> from procalc.stack import OpStack
+>>> conv = Converter()
+>>> stack = OpStack(conv.parse)
+>>> push_text(stack, ['1, 2.5; 0x10', '', '3'], conv.parse)
+4
+>>> push_binary(stack, '\\x01\\x00\\xff\\xff', 'int16')
+2
+>>> [stack.get(i) for i in reversed(range(len(stack)))]
+[1, 2.5, 16, 3, 1, -1]
+
+Binary types are int8, uint8, int16, uint16, int32, uint32, int64,
+uint64, float32 and float64, little endian unless 'be' is appended
+to the type name (e.g. int16be).
+"""
+
+from __future__ import with_statement
+
+import os
+import re
+import struct
+
+from procalc.i18n import _
+
+BINARY_TYPES = {
+        'int8': 'b', 'uint8': 'B',
+        'int16': 'h', 'uint16': 'H',
+        'int32': 'i', 'uint32': 'I',
+        'int64': 'q', 'uint64': 'Q',
+        'float32': 'f', 'float64': 'd',
+        }
+
+CHUNK_SIZE = 1 << 16
+
+TOKENS = re.compile(r'[^\s,;]+')
+
+class BulkError(ValueError):
+    pass
+
+def text_values(lines, parse):
+    '''
+    Parse numbers from lines of text, numbers are separated with
+    spaces, commas or semicolons
+    '''
+    findall = TOKENS.findall
+    for lineno, line in enumerate(lines):
+        try:
+            for token in findall(line):
+                yield parse(token)
+        except ValueError, e:
+            raise BulkError(_(u'Line %d: %s') % (lineno + 1, e))
+
+def binary_format(type_):
+    '''
+    >>> binary_format('int16be'), binary_format('float64')
+    ('>h', '<d')
+    '''
+    order = '<'
+    if type_.endswith('be'):
+        type_, order = type_[:-2], '>'
+    elif type_.endswith('le'):
+        type_ = type_[:-2]
+
+    try:
+        return order + BINARY_TYPES[type_]
+    except KeyError:
+        raise BulkError(_(u'Unknown binary type %s') % type_)
+
+def file_type(filename):
+    '''
+    Binary type named by file extension or None for text files
+
+    >>> file_type('readings.int16be'), file_type('readings.csv')
+    ('int16be', None)
+    '''
+    type_ = os.path.splitext(filename)[1][1:].lower()
+    try:
+        binary_format(type_)
+    except BulkError:
+        return None
+    return type_
+
+def binary_values(chunks, type_):
+    '''
+    Unpack numbers from chunks of binary data
+    '''
+    fmt = binary_format(type_)
+    size = struct.calcsize(fmt)
+    rest = ''
+    for chunk in chunks:
+        if rest:
+            chunk = rest + chunk
+        count = len(chunk) // size
+        rest = chunk[count * size:]
+        for value in struct.unpack(fmt[0] + str(count) + fmt[1], chunk[:count * size]):
+            yield value
+
+    if rest:
+        raise BulkError(_(u'Binary data size is not a multiple of %d bytes') % size)
+
+def file_chunks(f, size=CHUNK_SIZE):
+    return iter(lambda: f.read(size), '')
+
+def push_values(stack, values):
+    '''
+    Push values into the stack in one batch, return number of values
+    '''
+    count = len(stack)
+    stack.extend(values)
+    return len(stack) - count
+
+def push_text(stack, lines, parse):
+    return push_values(stack, text_values(lines, parse))
+
+def push_binary(stack, data, type_):
+    return push_values(stack, binary_values([data], type_))
+
+def push_file(stack, filename, parse, type_=None):
+    '''
+    Push numbers from file: binary file of type_ numbers if type_ is
+    given or named by file extension, text file otherwise
+    '''
+    type_ = type_ or file_type(filename)
+    with open(filename, 'rb') as f:
+        if type_:
+            return push_values(stack, binary_values(file_chunks(f), type_))
+        return push_values(stack, text_values(f, parse))
@@ -0,0 +1,75 @@
+# coding: utf-8
+
+class LRUCache(object):
+    '''
+    Bounded mapping, which forgets least recently used keys first
+    and counts lookup hits and misses.
+
+    >>> cache = LRUCache(2)
+    >>> cache['a'] = 1
+    >>> cache['b'] = 2
+    >>> cache.get('a')
+    1
+    >>> cache['c'] = 3
+    >>> cache.get('b') is None
+    True
+    >>> (cache.hits, cache.misses, len(cache))
+    (1, 1, 2)
+    '''
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._links = dict()
+        # Circular doubly linked list of [prev, next, key, value] links,
+        # most recently used link is right before the root.
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+    def get(self, key, default=None):
+        link = self._links.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+
+        prev, next_ = link[0], link[1]
+        prev[1] = next_
+        next_[0] = prev
+
+        root = self._root
+        last = root[0]
+        last[1] = root[0] = link
+        link[0] = last
+        link[1] = root
+
+        self.hits += 1
+        return link[3]
+
+    def __setitem__(self, key, value):
+        links = self._links
+        link = links.get(key)
+        if link is not None:
+            link[3] = value
+            return
+
+        root = self._root
+        if len(links) >= self.size:
+            oldest = root[1]
+            root[1] = oldest[1]
+            oldest[1][0] = root
+            del links[oldest[2]]
+
+        last = root[0]
+        last[1] = root[0] = links[key] = [last, root, key, value]
+
+    def clear(self):
+        self._links.clear()
+        root = self._root
+        root[:] = [root, root, None, None]
+
+    def __contains__(self, key):
+        return key in self._links
+
+    def __len__(self):
+        return len(self._links)
@@ -11,16 +11,22 @@ class Config(object):
         config_dir = os.environ.get('XDG_CONFIG_HOME', default_config_dir)
         config_file = os.path.join(config_dir, 'procalc', 'config.ini')
 
-        if not os.path.exists(config_dir):
-            os.makedirs(config_dir)
+        if not os.path.exists(os.path.dirname(config_file)):
+            os.makedirs(os.path.dirname(config_file))
 
         self._config_file = config_file
+        self.session_file = os.path.join(config_dir, 'procalc', 'session.bin')
         self._parser = ConfigParser(dict(
             orientation='0',
             precision='-1:-1',
             base='10',
-            view_mode='0'
+            view_mode='0',
+            digits='0',
+            word='',
+            undo_depth='100'
             ))
+        # Key bindings section has case sensitive keys
+        self._parser.optionxform = str
 
     def load(self):
         self._parser.read(self._config_file)
@@ -29,6 +35,15 @@ class Config(object):
         with open(self._config_file, 'wb') as f:
             self._parser.write(f)
 
+    def section(self, name):
+        '''
+        Get (name, value) pairs of a section without defaults
+        '''
+        if not self._parser.has_section(name):
+            return []
+        defaults = self._parser.defaults()
+        return [(k, v) for k, v in self._parser.items(name, raw=True) if k not in defaults]
+
     def __getitem__(self, name):
         return self._parser.get('DEFAULT', name)
 
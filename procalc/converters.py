@@ -3,9 +3,14 @@ from __future__ import division
 
 import math
 import struct
-import re
+import decimal
+from decimal import Decimal, ROUND_DOWN
 
 from procalc.i18n import _
+from procalc.cache import LRUCache
+from procalc import numeric
+from procalc.radix import formatter, from_digits
+from procalc.word import word_for
 
 class ConvertError(ValueError):
     pass
@@ -24,12 +29,17 @@ def strd(d):
 def noop(n):
     return n
 
+hexbin = dict(('%x' % i, ''.join(str(i >> s & 1) for s in (3, 2, 1, 0))) for i in range(16))
+
 def bin(x):
-    r = ''
-    n = abs(int(x))
-    while n:
-        r = str(n & 1) + r
-        n >>= 1
+    '''
+    Binary digits of integer part of x (empty string for zero),
+    converted through hex digits in linear time.
+
+    >>> bin(10), bin(-5), bin(0)
+    ('1010', '-101', '')
+    '''
+    r = ''.join([hexbin[c] for c in '%x' % abs(int(x))]).lstrip('0')
     if x < 0:
         return '-' + r
     return r
@@ -38,6 +48,9 @@ def repack(x, f, t):
     return struct.unpack(t, struct.pack(f, x))[0]
 
 def raw(x):
+    if isinstance(x, Decimal):
+        x = float(x)
+
     if isinstance(x, float):
         f, t = 'd', 'Q'
 
@@ -48,49 +61,230 @@ def raw(x):
 
     return repack(x, f, t)
 
+radix_digits = {
+        2: (1, lambda n, width: bin(n).rjust(width, '0')),
+        8: (3, lambda n, width: '%0*o' % (width, n)),
+        16: (4, lambda n, width: '%0*X' % (width, n)),
+        }
+
+decimal_digits = lambda n, width: '%0*d' % (width, n)
+
+def modf(x):
+    '''
+    math.modf() which keeps Decimal numbers exact
+    '''
+    if isinstance(x, Decimal):
+        intg = x.to_integral(ROUND_DOWN)
+        return x - intg, intg
+    return math.modf(x)
+
+def dbconv(x, base):
+    '''
+    Digits of Decimal fraction 0 <= x < 1 in given base, as many as
+    needed to keep the precision of current decimal context.
+    '''
+    sign, digits, exponent = x.as_tuple()
+    num, den = int(''.join(map(str, digits))), 10 ** -exponent
+    places = max(-exponent, decimal.getcontext().prec)
+    prec = int(math.ceil(places * math.log(10) / math.log(base)))
+
+    num *= base ** prec
+    try:
+        digits = radix_digits[base][1]
+    except KeyError:
+        digits = decimal_digits
+
+    if num % den:  # digits truncated by precision
+        return digits(num // den, prec)
+    return digits(num // den, prec).rstrip('0')
+
 def fbconv(x, base, prec=100):
-    r = ''
-    while x and len(r) < prec:
-        x, a = math.modf(x * base)
-        r += strd(int(a))
-    return r
+    '''
+    Digits of fraction 0 <= x < 1 in given base, at most prec digits.
+
+    For power of two bases float fraction is scaled as a whole integer,
+    so all digits are exact and come from a single big integer shift.
+
+    >>> fbconv(0.1, 16), fbconv(0.75, 2), fbconv(0.1, 10)
+    ('1999999999999A', '11', '1')
+    '''
+    if not x:
+        return ''
+
+    if isinstance(x, Decimal):
+        return dbconv(x, base)
+
+    try:
+        bits, digits = radix_digits[base]
+    except KeyError:
+        r = ''
+        while x and len(r) < prec:
+            x, a = math.modf(x * base)
+            r += strd(int(a))
+        return r
+
+    # x == num / 2 ** scale
+    mantissa, exponent = math.frexp(x)
+    num, scale = int(math.ldexp(mantissa, 53)), 53 - exponent
+
+    shift = bits * prec - scale
+    if shift >= 0:
+        return digits(num << shift, prec).rstrip('0')
+
+    if num & ((1 << -shift) - 1):  # digits truncated by precision
+        return digits(num >> -shift, prec)
+    return digits(num >> -shift, prec).rstrip('0')
 
 def bfrexp(x, base, lng=0):
     if not x:
         return 0.0, 0
 
+    if isinstance(x, Decimal):
+        # Decimal may be out of float range, take logarithm by parts
+        adjusted = x.adjusted()
+        log = (adjusted + math.log10(numeric.significand(x))) / math.log10(base)
+        power = int(round(log)) - lng + int(abs(x) >= 1)
+        return x / Decimal(base) ** power, power
+
     power = int(round(math.log(abs(x), base))) - lng + int(abs(x) >= 1)
     return x / base ** power, power
 
+# Number scanner
+
+DIGITS = '0123456789ABCDEF'
+PREFIXES = {'0x': 16, '0o': 8, '0b': 2}
+
+def scan_number(s):
+    '''
+    Scan number at the start of string s:
+    [sign] [0x|0o|0b] [digits] [.digits] [e[sign]digits]
+
+    Return tuple of (sign, prefix, integer, fraction, exponent) parts
+    (missing parts are None) and the rest of string, or (None, s) if
+    the number is malformed.
+
+    >>> scan_number('-0x1F.8e+2+3j')
+    (('-', '0x', '1F', '8', '+2'), '+3j')
+    >>> scan_number('1.e5')
+    (None, '1.e5')
+    '''
+    rest = s
+    sign = rest[:1]
+    if sign == '+' or sign == '-':
+        rest = rest[1:]
+    else:
+        sign = None
+
+    prefix = rest[:2]
+    if prefix in PREFIXES:
+        rest = rest[2:]
+    else:
+        prefix = None
+
+    tail = rest.lstrip(DIGITS)
+    integer = rest[:len(rest) - len(tail)] or None
+    rest = tail
+
+    fraction = None
+    if rest[:1] == '.':
+        tail = rest[1:].lstrip(DIGITS)
+        fraction = rest[1:len(rest) - len(tail)]
+        if not fraction:
+            return None, s
+        rest = tail
+
+    exponent = None
+    if rest[:1] == 'e':
+        esign = rest[1:2]
+        if esign == '+' or esign == '-':
+            rest = rest[2:]
+        else:
+            esign = ''
+            rest = rest[1:]
+        tail = rest.lstrip(DIGITS)
+        exponent = rest[:len(rest) - len(tail)]
+        if not exponent:
+            return None, s
+        exponent = esign + exponent
+        rest = tail
+
+    return (sign, prefix, integer, fraction, exponent), rest
+
+def compose(backend, hexdigits, sign, prefix, integer, fraction, exponent):
+    '''
+    Compose number from parts found by scan_number(), return the number
+    and its base.  Numbers without prefix are hexadecimal if hexdigits
+    is true.  Real numbers are created by numeric backend.
+    '''
+    base = PREFIXES.get(prefix, 10)
+    if base == 10 and hexdigits:
+        base = 16
+
+    if base == 10:
+        if fraction:
+            value = backend.real((sign or '') + (integer or '0') + '.' + fraction)
+        else:
+            value = from_digits((sign or '') + (integer or '0'))
+
+        if exponent:
+            value *= backend.pow(10, int(exponent))
+
+        return value, base
+
+    value = int(integer or '0', base)
+    if fraction:
+        value += backend.div(int(fraction, base), base ** len(fraction))
+
+    if exponent:
+        value *= backend.pow(base, int(exponent, base))
+
+    if sign == '-':
+        value = -value
+
+    return value, base
+
 # Formatter generators
 
-format_char = {16: ('X', '0x', None), 10: ('d', '', None), 8: ('o', '0o', None), 2: ('s', '0b', bin)}
+format_char = {
+        16: ('0x', '%X'.__mod__),
+        10: ('', formatter(10)),
+        8: ('0o', '%o'.__mod__),
+        2: ('0b', bin),
+        }
 
 def format_func1(lng, dec, base):
-    char, pfx, func = format_char.get(base)
-    format = '%%s%s%%0%d%s' % (pfx, abs(lng), char)
-    if func:
-        return lambda a, b, c: (format % ('-' if a < 0 else '', func(abs(a)))).replace(' ', '0')
-    else:
-        return lambda a, b, c: (format % ('-' if a < 0 else '', abs(a))).replace(' ', '0')
+    pfx, digits = format_char[base]
+    width = abs(lng)
+
+    def format(a, b, c):
+        if a < 0:
+            return '-' + pfx + digits(-a).rjust(width, '0')
+        return pfx + digits(a).rjust(width, '0')
+    return format
 
 def format_func2(lng, dec, base):
-    char, pfx, func = format_char.get(base)
-    format = '%%s%s%%0%d%s.%%-0%ds' % (pfx, abs(lng), char, abs(dec))
-    if func:
-        return lambda a, b, c: (format % ('-' if a < 0 else '', func(abs(a)), fbconv(b, base))).replace(' ', '0')
-    else:
-        return lambda a, b, c: (format % ('-' if a < 0 else '', abs(a), fbconv(b, base))).replace(' ', '0')
+    pfx, digits = format_char[base]
+    width, decimals = abs(lng), abs(dec)
+
+    def format(a, b, c):
+        return ''.join((
+            '-' if a < 0 or b < 0 else '', pfx, digits(int(abs(a))).rjust(width, '0'),
+            '.', fbconv(abs(b), base).ljust(decimals, '0')))
+    return format
 
 def format_func3(lng, dec, base):
-    char, pfx, func = format_char.get(base)
-    format = '%%s%s%%0%d%s.%%-0%dse%%%s' % (pfx, abs(lng), char, abs(dec), char)
-    if func:
-        return lambda a, b, c: (format % ('-' if a < 0 else '', func(abs(a)), fbconv(b, base), func(c))).replace(' ', '0')
-    else:
-        return lambda a, b, c: (format % ('-' if a < 0 else '', abs(a), fbconv(b, base), c)).replace(' ', '0')
+    pfx, digits = format_char[base]
+    width, decimals = abs(lng), abs(dec)
+
+    def format(a, b, c):
+        return ''.join((
+            '-' if a < 0 or b < 0 else '', pfx, digits(int(abs(a))).rjust(width, '0'),
+            '.', fbconv(abs(b), base).ljust(decimals, '0'), 'e', digits(c)))
+    return format
 
-# Splitters
+# Splitters: value is split into integer part, fraction and exponent.
+# Fraction has the sign of the value, integer part of values between -1
+# and 0 is 0 (or -0.0, which is not less than 0).
 
 def splitn1(x, lng, dec, base):
     return x, 0, 0
@@ -100,15 +294,17 @@ def splitraw(x, lng, dec, base):
 
 def splitn3(x, lng, dec, base):
     num, exp = bfrexp(x, base, lng)
-    frac, intg = math.modf(num)
-    return intg, abs(frac), exp
+    frac, intg = modf(num)
+    return intg, frac, exp
 
 def splitn2(x, lng, dec, base):
-    frac, intg = math.modf(x)
-    return intg, abs(frac), 0
+    frac, intg = modf(x)
+    return intg, frac, 0
 
 def fround(x, dec, base):
     p = base ** dec
+    if isinstance(x, Decimal):
+        return (x * p).to_integral() / p
     return round(x * p) / p
 
 mode_func = [
@@ -118,6 +314,15 @@ mode_func = [
         ]
 
 def rounded(dec):
+    '''
+    Round fraction of splitter func to dec digits
+
+    >>> split = rounded(2)(splitn2)
+    >>> format_func2(4, 2, 10)(*split(-0.999, 4, 2, 10))
+    '-0001.00'
+    >>> format_func2(0, 0, 10)(*rounded(0)(splitn2)(-0.5, 0, 0, 10))
+    '-1.'
+    '''
     def decorator(func):
         if dec < 0:
             return func
@@ -127,17 +332,42 @@ def rounded(dec):
 
         def wrapper(x, lng, dec, base):
             a, b, c = func(x, lng, dec, base)
-            if b: b = fround(b, dec, base)
+            if b:
+                negative = b < 0
+                b = fround(abs(b), dec, base)
+                if b >= 1:  # carry rounded fraction into integer part
+                    b -= 1
+                    a += -1 if negative else 1
+                if negative:
+                    b = -b
             return a, b, c
         return wrapper
     return decorator
 
-def format_func(mode, lng, dec, base):
+formatters = dict()
+
+def format_func(mode, lng, dec, base, word=None):
+    '''
+    Get formatter for given view mode, precision, base and word size.
+    Formatters are built once and shared by all converters.
+    '''
+    key = (mode, lng, dec, base, word)
+    try:
+        return formatters[key]
+    except KeyError:
+        pass
+
     _int, _float  = mode_func[mode]
 
-    split_int = rounded(dec)(_int[0])
     format_int = _int[1](lng, dec, base)
-    int_func = lambda x: format_int(*split_int(x, lng, dec, base))
+    if _int[0] is splitn1:
+        int_func = lambda x: format_int(x, 0, 0)
+    elif _int[0] is splitraw and word is not None:
+        unsigned = word.unsigned
+        int_func = lambda x: format_int(unsigned(x), 0, 0)
+    else:
+        split_int = rounded(dec)(_int[0])
+        int_func = lambda x: format_int(*split_int(x, lng, dec, base))
 
     split_float = rounded(dec)(_float[0])
     format_float = _float[1](lng, dec, base)
@@ -145,26 +375,33 @@ def format_func(mode, lng, dec, base):
 
     complex_func = lambda x: '%s%s%sj' % (float_func(x.real), '' if x.imag < 0 else '+', float_func(x.imag))
 
-    formatters = {
+    funcs = {
             int: int_func,
             long: int_func,
             float: float_func,
+            Decimal: float_func,
             complex: complex_func,
             }
-    return lambda x: formatters.get(type(x))(x)
+
+    def formatter(x):
+        try:
+            func = funcs[type(x)]
+        except KeyError:
+            raise ConvertFormatError(_(u'Unsupported value type %s') % type(x).__name__)
+        return func(x)
+
+    formatters[key] = formatter
+    return formatter
 
 class Converter(object):
 
-    def __init__(self):
-        sign = r'([+-])'
-        number = r'(0x|0o|0b)?([0-9A-F]+)?(?:\.([0-9A-F]+))?(?:e([+-]?[0-9A-F]+))?'
-        snumber = sign + '?' + number
-        inumber = snumber + 'j'
-        cnumber = snumber + sign + number + 'j'
+    parse_cache_size = 1024
 
-        self._renum = re.compile('^' + snumber + '$')
-        self._recnum = re.compile('^' + cnumber + '$')
-        self._reinum = re.compile('^' + inumber + '$')
+    def __init__(self):
+        # Parsed value depends on the literal only, so the cache needs
+        # no invalidation on base/mode changes.  Detected base is cached
+        # along with the value to switch base in autobase mode.
+        self.parse_cache = LRUCache(self.parse_cache_size)
 
         self._mode = 0
         self._length = -1
@@ -172,6 +409,9 @@ class Converter(object):
         self._base = 10
         self._autobase = False
         self._formatter = format_func(0, -1, -1, 10)
+        self._backend = numeric.get_backend()
+        self._word = None
+        self._wrap = None
 
     def mode(self):
         return self._mode
@@ -207,67 +447,131 @@ class Converter(object):
 
     base = property(base, set_base)
 
+    def reset_base(self, base):
+        '''
+        Switch back to base in autobase mode, until a number in another
+        base is parsed
+        '''
+        if self._autobase and base != self._base:
+            self._base = base
+            self._generate_formatter()
+
+    def digits(self):
+        return self._backend.digits
+
+    def set_digits(self, digits):
+        '''
+        Set number of significant digits for real numbers,
+        0 means machine floats.  Numeric backend is process wide.
+        '''
+        self._backend = numeric.backend_for(digits)
+        numeric.set_backend(self._backend)
+        self.parse_cache.clear()
+
+    digits = property(digits, set_digits)
+
+    def word(self):
+        return self._word.name if self._word else ''
+
+    def set_word(self, name):
+        '''
+        Set fixed width integers mode (int8 .. uint128), empty name
+        means unbounded integers.  Parsed integers are wrapped to the
+        word, so are operation results pushed into a stack guarded with
+        parse().
+        '''
+        self._word = word_for(name)
+        self._wrap = self._word and self._word.wrap
+        self._generate_formatter()
+
+    word = property(word, set_word)
+
+    @property
+    def wrap(self):
+        '''
+        Function wrapping integers to the word, None for unbounded
+        integers
+        '''
+        return self._wrap
+
+    @property
+    def formatter(self):
+        '''
+        Current formatter, formatters are shared, so a new formatter
+        means base, mode or precision change
+        '''
+        return self._formatter
+
     def _generate_formatter(self):
-        self._formatter = format_func(self._mode, self._length, self._decimals, self._base)
+        self._formatter = format_func(self._mode, self._length, self._decimals, self._base, self._word)
+
+    def instrument(self, profiler):
+        '''
+        Count and time parse() and format() calls with profiler, call
+        before parse() and format() are passed around
+        '''
+        self.parse = profiler.timed('converter.parse', self.parse)
+        self.format = profiler.timed('converter.format', self.format)
 
     def parse(self, s):
         '''
         Parts:
         sign, base, integer, fraction, exponent
         '''
-        if isinstance(s, (int, long, float, complex)):
+        if isinstance(s, (int, long, float, complex, Decimal)):
+            if self._wrap and isinstance(s, (int, long)):
+                return self._wrap(s)
+            if self._backend.digits and isinstance(s, float):
+                return self._backend.number(s)
             return s
 
-        def compose(sign, base, integer, fraction, exponent):
-            base = {'0x': 16, '0o': 8, '0b': 2}.get(base, 10)
-            if base == 10:
-                for c in 'ABCDEF':
-                    if c in s:
-                        base = 16
-                        break
-
-            if self._autobase:
-                self._base = base
-                self._generate_formatter()
-
-            if base == 10:
-                b = base ** int(exponent or '0', base)
-                if fraction:
-                    n = (sign or '') + (integer or '0') + '.' + (fraction or '0')
-                    return float(n) * b
-                else:
-                    return int((sign or '') + (integer or '0')) * b
-
-            sign = sign == '-' and -1 or 1
-
-            integer = int(integer or '0', base)
-            if fraction:
-                integer += sum(int(a, base) / base ** (i + 1) for i, a in enumerate(fraction))
-
-            if exponent:
-                integer *= base ** int(exponent, base)
-
-            return sign * integer
-
-        if s.endswith('j'):  # complex
-            parsed = self._recnum.match(s)
-            if parsed:
-                parts = parsed.groups()
-                real = compose(*parts[0:5])
-                imag = compose(*parts[5:10])
-            else:
-                parsed = self._reinum.match(s)
-                if not parsed:
-                    raise ConvertParseError(_(u'Incorrect complex number format'))
-                real = 0
-                imag = compose(*parsed.groups())
-            return complex(real, imag)
-
-        else:  # real
-            parsed = self._renum.match(s)
-            if not parsed:
-                raise ConvertParseError(_(u'Incorrect real number format'))
-            return compose(*parsed.groups())
+        parsed = self.parse_cache.get(s)
+        if parsed is None:
+            parsed = self.parse_cache[s] = self._parse(s)
+
+        value, base = parsed
+        if self._autobase and base != self._base:
+            self._base = base
+            self._generate_formatter()
+
+        if self._wrap and isinstance(value, (int, long)):
+            return self._wrap(value)
+        return value
+
+    def _parse(self, s):
+        '''
+        Parse number literal, return its value and base
+        '''
+        if s.isdigit():
+            return from_digits(s), 10
+
+        hexdigits = False
+        for c in 'ABCDEF':
+            if c in s:
+                hexdigits = True
+                break
+
+        parts, rest = scan_number(s)
+        if parts is None:
+            pass
+
+        elif not rest:  # real
+            return compose(self._backend, hexdigits, *parts)
+
+        elif rest == 'j':  # imaginary
+            imag, base = compose(self._backend, hexdigits, *parts)
+            return complex(0, imag), base
+
+        elif rest[0] in '+-':  # complex
+            imag, rest = scan_number(rest)
+            if imag is not None and rest == 'j':
+                real, base = compose(self._backend, hexdigits, *parts)
+                imag, base = compose(self._backend, hexdigits, *imag)
+                return complex(real, imag), base
+
+        if s.endswith('j'):
+            raise ConvertParseError(_(u'Incorrect complex number format'))
+        raise ConvertParseError(_(u'Incorrect real number format'))
 
     def format(self, x):
         return self._formatter(x)
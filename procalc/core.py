@@ -0,0 +1,51 @@
+# coding: utf-8
+"""
+Calculator engine for headless use.
+
+The engine (stack, operations, converters, numeric backends and
+config) imports neither gtk/hildon/dbus nor gettext: translation
+catalogs are loaded on the first translated message.  Import of the
+engine stays within IMPORT_BUDGET seconds:
+
+>>> import os, sys, subprocess
+>>> script = (
+...     'import sys, time; start = time.time(); import procalc.core; '
+...     'print time.time() - start; '
+...     'print sorted(m for m in %r if m in sys.modules)' % (GUI_MODULES + ('gettext',),))
+>>> root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+>>> env = dict(os.environ, PYTHONPATH=root)
+>>> output = subprocess.Popen([sys.executable, '-c', script], env=env, stdout=subprocess.PIPE).communicate()[0]
+>>> seconds, modules = output.splitlines()
+>>> modules
+'[]'
+>>> float(seconds) < IMPORT_BUDGET
+True
+"""
+
+from procalc.stack import OpStack, Program, StackError, StackUnderflowError
+from procalc.operations import __ops__ as OPERATIONS, OperationError
+from procalc.converters import Converter, ConvertError
+from procalc.config import Config
+from procalc import numeric
+
+__all__ = ['OpStack', 'Program', 'StackError', 'StackUnderflowError',
+        'OPERATIONS', 'OperationError', 'Converter', 'ConvertError',
+        'Config', 'numeric', 'calculator']
+
+GUI_MODULES = ('gtk', 'gobject', 'hildon', 'dbus')
+
+# Seconds
+IMPORT_BUDGET = 0.25
+
+def calculator(conv=None):
+    '''
+    Make stack with all operations, guarded with converter parse()
+
+    >>> stack = calculator()
+    >>> for token in '2 ↑ 10 − 1'.split():
+    ...     stack.push_op(token)
+    >>> stack.pop_op()
+    1023
+    '''
+    conv = conv or Converter()
+    return OpStack(conv.parse, *OPERATIONS)
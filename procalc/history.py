@@ -0,0 +1,146 @@
+# coding: utf-8
+"""
+Undo and redo of stack changes.
+
+History records a snapshot of the stack every time the stack is
+changed.  Snapshots are persistent lists: an entry is a cons cell
+(value, cell below), so a snapshot shares all entries left intact
+with the previous one and costs as much as the entries changed by
+the action, not as the whole stack.  Undo and redo rewind the stack
+to the snapshot the same way, only entries above the part shared by
+both snapshots are replaced:
+
+>>> from procalc.operations import __ops__
+>>> stack = OpStack(int, *__ops__)
+>>> stack.extend(range(5))
+>>> history = History(stack, depth=10)
+>>> stack.push_op('+')
+>>> stack.push(10)
+>>> stack.pop_op()
+14
+>>> stack.as_str()
+'3\\n2\\n1\\n0'
+>>> history.undo(), stack.as_str()
+(True, '[+]\\n10\\n4\\n3\\n2\\n1\\n0')
+>>> history.undo(), history.undo(), stack.as_str()
+(True, True, '4\\n3\\n2\\n1\\n0')
+>>> history.undo()
+False
+>>> history.redo(), history.redo(), stack.as_str()
+(True, True, '[+]\\n10\\n4\\n3\\n2\\n1\\n0')
+>>> stack.clear()
+>>> history.redo()
+False
+
+Only depth snapshots are kept, a new change drops snapshots to redo.
+"""
+
+from procalc.stack import OpStack, STACK_INSERT, STACK_REPLACE, STACK_OPS
+
+DEPTH = 100
+
+class History(object):
+
+    def __init__(self, stack, depth=DEPTH):
+        self.stack = stack
+        self.depth = depth
+        self._undo = list()
+        self._redo = list()
+        self._rewinding = False
+
+        cell = None
+        for i in reversed(xrange(len(stack))):
+            cell = (stack.get(i), cell)
+        self._current = (len(stack), cell, tuple(stack.pending()))
+
+        stack.connect(self._changed)
+
+    def __len__(self):
+        return len(self._undo)
+
+    def _changed(self, changes):
+        if self._rewinding:
+            return
+
+        stack = self.stack
+        length, cell, opstack = self._current
+
+        # Entries below low are the same as in current snapshot
+        low = len(stack)
+        for event, index in changes:
+            if event is STACK_INSERT or event is STACK_REPLACE:
+                low -= 1
+            elif event is STACK_OPS:
+                opstack = tuple(stack.pending())
+
+        if low:
+            for i in xrange(length - low):
+                cell = cell[1]
+        else:
+            cell = None
+
+        for i in reversed(xrange(len(stack) - low)):
+            cell = (stack.get(i), cell)
+
+        self._push_undo(self._current)
+        self._current = (len(stack), cell, opstack)
+        del self._redo[:]
+
+    def _push_undo(self, snapshot):
+        undo = self._undo
+        undo.append(snapshot)
+        if len(undo) > self.depth:
+            del undo[0]
+
+    def _rewind(self, snapshot):
+        '''
+        Change stack to the snapshot
+        '''
+        length, cell, opstack = snapshot
+        keep, shared, _ = self._current
+
+        # Find the entries shared by both snapshots
+        while length > keep:
+            cell = cell[1]
+            length -= 1
+        while keep > length:
+            shared = shared[1]
+            keep -= 1
+        while shared is not cell:
+            shared, cell = shared[1], cell[1]
+            keep -= 1
+
+        entries = list()
+        length, cell, opstack = snapshot
+        for i in xrange(length - keep):
+            entries.append(cell[0])
+            cell = cell[1]
+        entries.reverse()
+
+        self._rewinding = True
+        try:
+            self.stack.rewind(keep, entries, opstack)
+        finally:
+            self._rewinding = False
+        self._current = snapshot
+
+    def undo(self):
+        '''
+        Undo the last change, return False if there is nothing to undo
+        '''
+        if not self._undo:
+            return False
+        self._redo.append(self._current)
+        self._rewind(self._undo.pop())
+        return True
+
+    def redo(self):
+        '''
+        Redo the last undone change, return False if there is nothing
+        to redo
+        '''
+        if not self._redo:
+            return False
+        self._push_undo(self._current)
+        self._rewind(self._redo.pop())
+        return True
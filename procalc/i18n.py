@@ -20,13 +20,28 @@ RPN-калькулятор с побитовыми операциями
 Автор: Константин Степанов, © 2010
 """
 
-from gettext import translation
+import os
 
 __all__ = ['_']
 
-try:
-    _i18n = translation('procalc')
-except IOError:
-    _i18n = translation('procalc', './i18n')
+# Catalogs compiled in the source tree, used if there are no installed ones
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'i18n')
 
-_ = _i18n.ugettext
+_i18n = None
+
+def load():
+    '''
+    Load translation catalog, it is loaded on first use otherwise.
+    Messages are left untranslated if there is no catalog.
+    '''
+    global _i18n
+    if _i18n is None:
+        from gettext import translation
+        try:
+            _i18n = translation('procalc')
+        except IOError:
+            _i18n = translation('procalc', LOCALE_DIR, fallback=True)
+    return _i18n
+
+def _(message):
+    return (_i18n or load()).ugettext(message)
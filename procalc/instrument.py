@@ -0,0 +1,127 @@
+# coding: utf-8
+"""
+Engine instrumentation.
+
+Profiler counts calls and times stack methods, operations, parsing and
+formatting and tracks stack depth high water mark.  Nothing is wrapped
+unless OpStack.instrument() and Converter.instrument() are called, so
+disabled instrumentation costs nothing:
+
+>>> from procalc import operations
+>>> from procalc.converters import Converter
+>>> from procalc.stack import OpStack
+>>> profiler = Profiler()
+>>> conv = Converter()
+>>> conv.instrument(profiler)
+>>> stack = OpStack(conv.parse, *operations.__ops__)
+>>> stack.instrument(profiler)
+>>> for token in '1 + 2 * 3'.split():
+...     stack.push_op(token)
+>>> conv.format(stack.pop_op())
+'7'
+>>> stats = profiler.report()
+>>> stats['calls']['op *']['calls'], stats['calls']['converter.parse']['calls'], stats['max_depth']
+(1, 5, 3)
+
+Profiles are dumped as JSON (.json files) or as marshalled cProfile
+compatible stats for pstats (any other file name).  Both the batch
+mode and the GUI profile the engine when PROCALC_PROFILE environment
+variable names a file to dump the profile to on exit.
+"""
+
+from __future__ import with_statement
+
+import os
+import time
+import marshal
+
+PROFILE_ENV = 'PROCALC_PROFILE'
+
+class Profiler(object):
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        # name -> [calls, own time, cumulative time]
+        self.stats = dict()
+        self.max_depth = 0
+        self._frames = list()
+
+    def timed(self, name, func, stack=None):
+        '''
+        Wrap func to count its calls and time, own time excludes time
+        of nested timed calls.  Stack depth is checked after every call
+        if stack is given.
+        '''
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+        frames = self._frames
+        clock = self.clock
+
+        def wrapper(*args, **kw):
+            frames.append(0.0)
+            start = clock()
+            try:
+                return func(*args, **kw)
+            finally:
+                elapsed = clock() - start
+                stats[0] += 1
+                stats[1] += elapsed - frames.pop()
+                stats[2] += elapsed
+                if frames:
+                    frames[-1] += elapsed
+                if stack is not None and len(stack) > self.max_depth:
+                    self.max_depth = len(stack)
+
+        wrapper.__name__ = getattr(func, '__name__', name)
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    def operation(self, op, stack):
+        '''
+        Timed copy of stack operation
+        '''
+        wrapper = self.timed('op ' + op.op_name, op, stack)
+        for attr in dir(op):
+            if attr.startswith('op_'):
+                setattr(wrapper, attr, getattr(op, attr))
+        return wrapper
+
+    def called(self):
+        '''
+        (name, calls, own time, cumulative time) of everything called
+        '''
+        return [(name, calls, own, cumulative)
+                for name, (calls, own, cumulative) in self.stats.iteritems() if calls]
+
+    def report(self):
+        return dict(
+                calls=dict((name, dict(calls=calls, time=own, cumulative=cumulative))
+                    for name, calls, own, cumulative in self.called()),
+                max_depth=self.max_depth,
+                )
+
+    def dump_json(self, filename):
+        # json is not available in Python 2.5
+        import json
+        with open(filename, 'wb') as f:
+            json.dump(self.report(), f, indent=1, sort_keys=True)
+
+    def dump_stats(self, filename):
+        '''
+        Write stats in cProfile format, readable with pstats.Stats()
+        '''
+        stats = dict((('procalc', 0, name), (calls, calls, own, cumulative, {}))
+                for name, calls, own, cumulative in self.called())
+        with open(filename, 'wb') as f:
+            marshal.dump(stats, f)
+
+    def dump(self, filename):
+        if filename.endswith('.json'):
+            self.dump_json(filename)
+        else:
+            self.dump_stats(filename)
+
+def profile_file():
+    '''
+    Name of file to dump profile to, None if profiling is disabled
+    '''
+    return os.environ.get(PROFILE_ENV) or None
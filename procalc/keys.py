@@ -0,0 +1,140 @@
+# coding: utf-8
+"""
+Keyboard bindings.
+
+Binding maps a key character to a pair of (kind, argument), kind
+selects application method key_<kind>() to call with the argument:
+
+insert -- insert character into input,
+operation -- push input and start operation,
+toggle -- toggle boolean application property,
+action -- call application method (button click handler).
+
+Bindings are turned into a dispatch table once, so a key press
+costs one dict lookup:
+
+>>> class App(object):
+...     def key_insert(self, ch):
+...         print 'insert', ch
+>>> keymap = build_keymap(App(), {u'q': ('insert', u'1')})
+>>> keymap[ord(u'q')]()
+insert 1
+
+Default bindings can be changed in [keys] section of config file,
+one key per line, key is a character or its code point as U+XXXX:
+
+[keys]
+q = insert 7
+U+0020 = action hit_execute
+"""
+
+from functools import partial
+
+from procalc.i18n import _
+
+KINDS = ('insert', 'operation', 'toggle', 'action')
+
+DEFAULT_BINDINGS = {
+        u'q': ('insert', u'1'),
+        u'w': ('insert', u'2'),
+        u'e': ('insert', u'3'),
+        u'r': ('insert', u'4'),
+        u't': ('insert', u'5'),
+        u'y': ('insert', u'6'),
+        u'u': ('insert', u'7'),
+        u'i': ('insert', u'8'),
+        u'o': ('insert', u'9'),
+        u'p': ('insert', u'0'),
+        u'g': ('action', 'hit_switch_sign'),
+        u'_': ('action', 'hit_switch_sign'),
+
+        u'+': ('operation', u'+'),
+        u's': ('operation', u'+'),
+        u'-': ('operation', u'−'),
+        u'f': ('operation', u'−'),
+        u'*': ('operation', u'*'),
+        u'a': ('operation', u'*'),
+        u'/': ('operation', u'/'),
+        u'v': ('operation', u'/'),
+        u'\\': ('operation', u'↑'),
+        u'b': ('operation', u'↑'),
+        u'&': ('operation', u'&'), # and
+        u'k': ('operation', u'&'), # and
+        u'|': ('operation', u'|'), # or
+        u'z': ('operation', u'|'), # or
+        u'#': ('operation', u'^'), # xor
+        u'd': ('operation', u'^'), # xor
+        u'!': ('operation', u'~'), # not
+        u'l': ('operation', u'~'), # not
+        u'$': ('operation', u'&~'), # and not
+        u'x': ('operation', u'&~'), # and not
+        u'm': ('toggle', 'is_mode'),
+        u'n': ('toggle', 'is_func'),
+        u'h': ('action', 'hit_push_stack'),
+        u'j': ('action', 'hit_pop_stack'),
+        u'(': ('action', 'hit_push_stack'),
+        u')': ('action', 'hit_pop_stack'),
+        u' ': ('action', 'hit_push_stack'),
+        u'=': ('action', 'hit_execute'),
+        u',': ('action', 'hit_execute'),
+        u'\uff8d': ('action', 'hit_execute'),
+        u'c': ('action', 'hit_clear'),
+        }
+
+class KeyBindingError(ValueError):
+    pass
+
+def parse_key(key):
+    '''
+    >>> parse_key('U+0020'), parse_key('q')
+    (u' ', u'q')
+    '''
+    if isinstance(key, str):
+        key = key.decode('utf-8')
+    if len(key) > 2 and key[:2] in (u'U+', u'u+'):
+        try:
+            return unichr(int(key[2:], 16))
+        except ValueError:
+            pass
+    elif len(key) == 1:
+        return key
+    raise KeyBindingError(_(u'Incorrect key %s') % key)
+
+def parse_binding(value):
+    '''
+    >>> parse_binding('operation −')
+    ('operation', u'\\u2212')
+    '''
+    if isinstance(value, str):
+        value = value.decode('utf-8')
+    try:
+        kind, arg = value.split(None, 1)
+    except ValueError:
+        raise KeyBindingError(_(u'Incorrect key binding %s') % value)
+
+    kind = str(kind)
+    if kind not in KINDS:
+        raise KeyBindingError(_(u'Unknown key binding kind %s') % kind)
+    if kind in ('toggle', 'action'):
+        arg = str(arg)
+    return kind, arg
+
+def load_bindings(config):
+    '''
+    Default bindings updated with [keys] section of config
+    '''
+    bindings = dict(DEFAULT_BINDINGS)
+    for key, value in config.section('keys'):
+        bindings[parse_key(key)] = parse_binding(value)
+    return bindings
+
+def build_keymap(app, bindings):
+    '''
+    Build dispatch table: key value to application handler
+    '''
+    keymap = dict()
+    for key, (kind, arg) in bindings.iteritems():
+        if kind in ('toggle', 'action') and not hasattr(app, arg):
+            raise KeyBindingError(_(u'Unknown key binding target %s') % arg)
+        keymap[ord(key)] = partial(getattr(app, 'key_' + kind), arg)
+    return keymap
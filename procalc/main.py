@@ -2,25 +2,32 @@
 
 import gobject
 import gtk
-import dbus
 import hildon
 
-from procalc import operations
+from procalc import operations, i18n
 from procalc.i18n import _
 from procalc.operations import OperationError
 from procalc.stack import OpStack, StackError
+from procalc.view import TextBufferView
 from procalc.helpers import button, switch, picker, selector, liststore, transpose_table
 from procalc.converters import Converter, ConvertError
 from procalc.config import Config
+from procalc.keys import load_bindings, build_keymap, KeyBindingError, DEFAULT_BINDINGS
+from procalc.startup import Startup
+from procalc.instrument import Profiler, profile_file
+from procalc.word import WORD_NAMES
+from procalc.history import History
+from procalc import snapshot, bulk
 
 __version__ = '0.3.3'
 
 class ProCalcApp(hildon.Program):
 
-    __bases = {'Bin': 2, 'Oct': 8, 'Dec': 10, 'Hex': 16, _(u'Auto'): -1}
-    __bases_ordered = ('Bin', 'Oct', 'Dec', 'Hex', _(u'Auto'))
-    __view_modes = [_(u'Normal'), _(u'Raw'), _(u'Base exp')]
-    __orientations = [_(u'Landscape'), _(u'Portrait'), _(u'Automatic (slider)'), _(u'Automatic (accel)')]
+    __digits = (0, 28, 50, 100, 1000)
+    __words = ('',) + WORD_NAMES
+
+    # Number of stack entries shown
+    view_limit = 1000
 
     __gsignals__ = {
             'mode-changed': (gobject.SIGNAL_RUN_FIRST, gobject.TYPE_NONE, (int,))
@@ -38,12 +45,10 @@ class ProCalcApp(hildon.Program):
         stack = hildon.TextView()
         input = hildon.Entry(gtk.HILDON_SIZE_AUTO)
 
-        input.set_placeholder(_(u'Empty value'))
         input.set_properties(
                 hildon_input_mode=gtk.HILDON_GTK_INPUT_MODE_ALPHA
                 | gtk.HILDON_GTK_INPUT_MODE_NUMERIC
                 | gtk.HILDON_GTK_INPUT_MODE_SPECIAL)
-        stack.set_placeholder(_(u'Stack is empty'))
         stack.set_properties(editable=False)
 
         self.w_stack = stack
@@ -51,6 +56,8 @@ class ProCalcApp(hildon.Program):
         self.w_input = input
         self.w_keypad = keypad
 
+        self.view = TextBufferView(self.stack, self.w_buffer, self.filter, lambda: self._conv.formatter, self.view_limit)
+
     def init_layout(self):
         panner = hildon.PannableArea()
         panner.add_with_viewport(self.w_stack)
@@ -88,17 +95,53 @@ class ProCalcApp(hildon.Program):
 
     def init_stack(self):
         self.stack = OpStack(self._conv.parse, *operations.__ops__)
+        self.stack.optimize()
+        if self._profile:
+            self.stack.instrument(self._profiler)
 
     def init_state(self):
         self._conv = Converter()
+        self._profile = profile_file()
+        self._profiler = Profiler()
+        if self._profile:
+            self._conv.instrument(self._profiler)
         self.opmode = False
+        self.history = None
+        self._session_loaded = False
         self._ninput = None
         self._sinput = ''
 
         self._portrait_mode = False
         self._orientation_mode = 0
 
+    def init_i18n(self):
+        i18n.load()
+
+        self.__bases = {'Bin': 2, 'Oct': 8, 'Dec': 10, 'Hex': 16, _(u'Auto'): -1}
+        self.__bases_ordered = ('Bin', 'Oct', 'Dec', 'Hex', _(u'Auto'))
+        self.__view_modes = [_(u'Normal'), _(u'Raw'), _(u'Base exp')]
+        self.__orientations = [_(u'Landscape'), _(u'Portrait'), _(u'Automatic (slider)'), _(u'Automatic (accel)')]
+
+        self.w_input.set_placeholder(_(u'Empty value'))
+        self.w_stack.set_placeholder(_(u'Stack is empty'))
+
+    def init_session(self):
+        '''
+        Restore stack saved on quit
+        '''
+        try:
+            snapshot.load(self.stack, self._config.session_file, self._conv.wrap)
+        except (IOError, OSError):
+            pass
+        except (snapshot.SnapshotError, StackError), e:
+            self.message(e.message, 4000)
+        self._session_loaded = True
+
+        # Restored stack is where the history starts
+        self.history = History(self.stack, int(self._config['undo_depth']))
+
     def init_dbus(self):
+        import dbus
         from dbus.mainloop.glib import DBusGMainLoop
         DBusGMainLoop(set_as_default=True)
 
@@ -118,6 +161,10 @@ class ProCalcApp(hildon.Program):
         self._slider.connect_to_signal('PropertyModified', slider_handler)
         self._bus.add_signal_receiver(accel_handler, 'sig_device_orientation_ind', 'com.nokia.mce.signal')
 
+        # Automatic orientation needs slider state
+        if self.orientation_mode > 1:
+            self.orientation_mode = self.orientation_mode
+
     def init_config(self):
         self._config = Config()
         self._config.load()
@@ -126,40 +173,75 @@ class ProCalcApp(hildon.Program):
         self._conv.precision = self._config['precision'].split(':')
         self._conv.mode = self._config['view_mode']
         self._conv.base = self._config['base']
+        self._conv.digits = self._config['digits']
+        # Checked here, as WordError message would load translations
+        if self._config['word'] in self.__words:
+            self._conv.word = self._config['word']
 
-    def __init__(self):
+        try:
+            self._keymap = build_keymap(self, load_bindings(self._config))
+        except KeyBindingError, e:
+            self.message(e.message, 4000)
+            self._keymap = build_keymap(self, DEFAULT_BINDINGS)
+
+    def __init__(self, started=None):
         super(ProCalcApp, self).__init__()
 
+        self.startup = Startup(started=started)
+        run, defer = self.startup.run, self.startup.defer
+
         # 0. set state attributes
-        self.init_state()
+        run('init_state', self.init_state)
+
+        # 1. init stack
+        run('init_stack', self.init_stack)
 
-        # 1. init dbus event listeners
-        self.init_dbus()
+        # 2. create window
+        run('init_window', self.init_window)
 
-        # 2. init stack
-        self.init_stack()
+        # 3. init main controls
+        run('init_controls', self.init_controls)
 
-        # 3. create window
-        self.init_window()
+        # 4. place controls into layout
+        run('init_layout', self.init_layout)
 
-        # 4. init main controls
-        self.init_controls()
+        # 5. init config
+        run('init_config', self.init_config)
 
-        # 5. place controls into layout
-        self.init_layout()
+        # Stages below are run after the window is shown
 
-        # 6. init config
-        self.init_config()
+        # 6. restore saved stack
+        defer('init_session', self.init_session)
 
-        # 7. init main menu
-        self.init_menu()
+        # 7. init dbus event listeners
+        defer('init_dbus', self.init_dbus)
+
+        # 8. load translations
+        defer('init_i18n', self.init_i18n)
+
+        # 9. init main menu
+        defer('init_menu', self.init_menu)
 
     def quit(self, *args):
         self._config['orientation'] = self.orientation_mode
         self._config['precision'] = '%d:%d' % self._conv.precision
         self._config['view_mode'] = self._conv.mode
         self._config['base'] = self._conv.base
+        self._config['digits'] = self._conv.digits
+        self._config['word'] = self._conv.word
         self._config.save()
+
+        # Quit before the deferred init_session() would overwrite the
+        # saved stack with the empty one
+        if self._session_loaded:
+            try:
+                snapshot.save(self.stack, self._config.session_file)
+            except (IOError, OSError, snapshot.SnapshotError):
+                pass
+
+        if self._profile:
+            self._profiler.dump(self._profile)
+
         gtk.main_quit()
 
     def create_menu(self):
@@ -176,7 +258,21 @@ class ProCalcApp(hildon.Program):
         nums = liststore(*range(-1, 65))
         menu.append(picker(_(u'Precision'), map(lambda x: x + 1, self._conv.precision), self.hit_change_precision, selector(nums, nums)))
 
+        # Number of significant digits for real numbers, 0 means
+        # machine floats.
+        digits = self._conv.digits
+        menu.append(picker(_(u'Digits'), (self.__digits.index(digits) if digits in self.__digits else 0,),
+            self.hit_change_digits, _(u'Machine'), *self.__digits[1:]))
+
+        # Fixed width integers
+        menu.append(picker(_(u'Word size'), (self.__words.index(self._conv.word),),
+            self.hit_change_word, _(u'Unbounded'), *self.__words[1:]))
+
         menu.append(picker(_(u'Orientation'), (self.orientation_mode,), self.hit_change_orientation, *self.__orientations))
+        menu.append(button(_(u'Undo'), self.hit_undo))
+        menu.append(button(_(u'Redo'), self.hit_redo))
+        menu.append(button(_(u'Import numbers'), self.hit_import_file))
+        menu.append(button(_(u'Paste numbers'), self.hit_paste_numbers))
         menu.append(button(_(u'About'), self.show_about_info))
         return menu
 
@@ -191,6 +287,42 @@ without any warranty.
 
 Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
 
+    def hit_import_file(self, b):
+        dialog = hildon.FileChooserDialog(self.window, gtk.FILE_CHOOSER_ACTION_OPEN)
+        try:
+            if dialog.run() != gtk.RESPONSE_OK:
+                return
+            filename = dialog.get_filename()
+        finally:
+            dialog.destroy()
+
+        try:
+            count = bulk.push_file(self.stack, filename, self._conv.parse)
+            self.message(_(u'%d numbers imported') % count, 2000)
+        except IOError, e:
+            self.message(str(e), 4000)
+        except (bulk.BulkError, StackError), e:
+            self.message(e.message, 4000)
+
+    def hit_paste_numbers(self, b):
+        text = gtk.clipboard_get().wait_for_text()
+        if not text:
+            return
+
+        try:
+            count = bulk.push_text(self.stack, text.splitlines(), self._conv.parse)
+            self.message(_(u'%d numbers imported') % count, 2000)
+        except (bulk.BulkError, StackError), e:
+            self.message(e.message, 4000)
+
+    def hit_undo(self, b):
+        if not (self.history and self.history.undo()):
+            self.message(_(u'Nothing to undo'), 2000)
+
+    def hit_redo(self, b):
+        if not (self.history and self.history.redo()):
+            self.message(_(u'Nothing to redo'), 2000)
+
     def filter(self, value):
         try:
             return self._conv.format(value)
@@ -201,6 +333,16 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
         self._conv.precision = b.get_value().split(':')
         self.update_view()
 
+    def hit_change_digits(self, b):
+        value = b.get_value()
+        self._conv.digits = 0 if value == _(u'Machine') else value
+        self.update_view()
+
+    def hit_change_word(self, b):
+        value = b.get_value()
+        self._conv.word = '' if value == _(u'Unbounded') else value
+        self.update_view()
+
     @property
     def is_slider_closed(self):
         return self._slider.GetProperty("button.state.value")
@@ -305,7 +447,6 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
         self.ninput = None
         if self.is_func:
             self.stack.clear()
-            self.w_buffer.set_text('')
             self.is_func = False
 
     def hit_push_stack(self, b):
@@ -315,7 +456,7 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
         self.stack_pop()
 
     def update_view(self):
-        self.w_buffer.set_text(self.stack.as_str(self.filter))
+        self.view.refresh()
 
         if not self.opmode:
             self.ninput = self.ninput
@@ -344,82 +485,26 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
         self._conv.mode = self.__view_modes.index(b.get_value())
         self.update_view()
 
+    def key_toggle(self, attr):
+        setattr(self, attr, not getattr(self, attr))
+
+    def key_insert(self, ch):
+        if self.opmode:
+            self.stack_push_op()
+            self.opmode = False
+        self.ins_input(ch)
+
+    def key_operation(self, ch):
+        self.stack_push_op()
+        self.opmode = True
+        self.add_input(ch)
+
+    def key_action(self, meth):
+        getattr(self, meth)(None)
+
     def hit_keyboard(self, w, ev):
-        def mod_key(attr):
-            def w():
-                setattr(self, attr, not getattr(self, attr))
-            return w
-
-        def ins_key(ch):
-            def w():
-                if self.opmode:
-                    self.stack_push_op()
-                    self.opmode = False
-                self.ins_input(ch)
-            return w
-
-        def op_key(ch):
-            def w():
-                self.stack_push_op()
-                self.opmode = True
-                self.add_input(ch)
-            return w
-
-        def act_key(meth):
-            def w():
-                getattr(self, meth)(None)
-            return w
-
-        char = unichr(ev.keyval)
-        keymap = {
-                u'q': ins_key(u'1'),
-                u'w': ins_key(u'2'),
-                u'e': ins_key(u'3'),
-                u'r': ins_key(u'4'),
-                u't': ins_key(u'5'),
-                u'y': ins_key(u'6'),
-                u'u': ins_key(u'7'),
-                u'i': ins_key(u'8'),
-                u'o': ins_key(u'9'),
-                u'p': ins_key(u'0'),
-                u'g': act_key('hit_switch_sign'),
-                u'_': act_key('hit_switch_sign'),
-
-                u'+': op_key(u'+'),
-                u's': op_key(u'+'),
-                u'-': op_key(u'−'),
-                u'f': op_key(u'−'),
-                u'*': op_key(u'*'),
-                u'a': op_key(u'*'),
-                u'/': op_key(u'/'),
-                u'v': op_key(u'/'),
-                u'\\': op_key(u'↑'),
-                u'b': op_key(u'↑'),
-                u'&': op_key(u'&'), # and
-                u'k': op_key(u'&'), # and
-                u'|': op_key(u'|'), # or
-                u'z': op_key(u'|'), # or
-                u'#': op_key(u'^'), # xor
-                u'd': op_key(u'^'), # xor
-                u'!': op_key(u'~'), # not
-                u'l': op_key(u'~'), # not
-                u'$': op_key(u'&~'), # and not
-                u'x': op_key(u'&~'), # and not
-                u'm': mod_key('is_mode'),
-                u'n': mod_key('is_func'),
-                u'h': act_key('hit_push_stack'),
-                u'j': act_key('hit_pop_stack'),
-                u'(': act_key('hit_push_stack'),
-                u')': act_key('hit_pop_stack'),
-                u' ': act_key('hit_push_stack'),
-                u'=': act_key('hit_execute'),
-                u',': act_key('hit_execute'),
-                u'\uff8d': act_key('hit_execute'),
-                u'c': act_key('hit_clear'),
-                }
-        #print char
         try:
-            action = keymap[char]
+            action = self._keymap[ev.keyval]
         except KeyError:
             return False
 
@@ -492,7 +577,6 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
     def stack_push(self):
         try:
             self.stack.push(self.input)
-            self.w_buffer.set_text(self.stack.as_str(self.filter))
             if not self.is_func:
                 self.ninput = None
 
@@ -502,7 +586,6 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
     def stack_pop(self):
         try:
             data = self.stack.pop()
-            self.w_buffer.set_text(self.stack.as_str(self.filter))
 
             input = self.input
             if self.is_func and input:
@@ -516,7 +599,6 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
     def stack_push_op(self):
         try:
             self.stack.push_op(self.input)
-            self.w_buffer.set_text(self.stack.as_str(self.filter))
             self.ninput = None
 
         except ConvertError, e:
@@ -532,8 +614,6 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
         except (StackError, OperationError), e:
             self.message(e.message, 4000)
 
-        self.w_buffer.set_text(self.stack.as_str(self.filter))
-
     def message(self, text, timeout=500):
         banner = hildon.hildon_banner_show_information(self.window, '',
                 str(text))
@@ -642,7 +722,12 @@ Author: Konstantin Stepanov, (c) 2010""") % dict(version=__version__))
         return buttons_box1, buttons_box2
 
     def run(self):
-        self.window.show_all()
-        self.orientation_mode = self._config['orientation']
+        self.startup.run('show', self.window.show_all)
+
+        # Automatic orientation is set once dbus is ready
+        if self.orientation_mode < 2:
+            self.orientation_mode = self.orientation_mode
+
+        gobject.idle_add(self.startup.idle)
         gtk.main()
 
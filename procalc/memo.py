@@ -0,0 +1,85 @@
+# coding: utf-8
+"""
+Memoization of pure operations.
+
+Memo wraps pure operations (registered by operation() with pure=True,
+the default) with a bounded LRU cache of their results keyed on
+operation name, arguments, argument types and the numeric backend.
+Stack operations, list operations and other stateful operations are
+passed as is:
+
+>>> from procalc import operations
+>>> from procalc.stack import OpStack
+>>> memo = Memo(size=16)
+>>> stack = OpStack(int, *memo.ops(operations.__ops__))
+>>> program = stack.compile('1 << 31 | 255'.split())
+>>> [stack.execute(program) for i in range(3)]
+[2147483903, 2147483903, 2147483903]
+>>> memo.hits, memo.misses
+(4, 2)
+
+Results for zero arguments are never cached, as signed zeros compare
+equal while results for them may differ (e.g. atg2).  Unhashable
+arguments (arrays) bypass the cache.
+"""
+
+from procalc import numeric
+from procalc.cache import LRUCache
+from procalc.operations import describe, dispatcher
+
+class Memo(object):
+    '''
+    Results cache shared by memoized operations
+    '''
+
+    def __init__(self, size=1024):
+        self._cache = LRUCache(size)
+
+    @property
+    def hits(self):
+        return self._cache.hits
+
+    @property
+    def misses(self):
+        return self._cache.misses
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        self._cache.clear()
+        self._cache.hits = self._cache.misses = 0
+
+    def cached(self, name, func):
+        '''
+        Wrap func with results cache
+        '''
+        cache = self._cache
+
+        def wrapper(*args):
+            key = (name, args, tuple(map(type, args)), numeric.backend)
+            try:
+                result = cache.get(key)
+            except TypeError:
+                return func(*args)
+
+            if result is None:
+                result = func(*args)
+                if all(args):
+                    cache[key] = result
+            return result
+
+        return wrapper
+
+    def wrap(self, op):
+        '''
+        Memoized copy of pure operation, other operations as is
+        '''
+        if not getattr(op, 'op_pure', False):
+            return op
+
+        wrapper = dispatcher(op.op_name, self.cached(op.op_name, op.op_func), op.op_types, op.op_results)
+        return describe(wrapper, op, op.op_name, op.op_prio, op.op_asso, True)
+
+    def ops(self, ops):
+        return [self.wrap(op) for op in ops]
@@ -0,0 +1,498 @@
+# coding: utf-8
+"""
+Numeric backends.
+
+Backend decides how real number literals and constants are created and
+how arithmetic, powers and transcendental functions are computed.  Like
+decimal context, the backend is process wide: operations call module
+level functions, which forward to the current backend.
+
+>>> set_backend(DecimalBackend(40))
+>>> print div(1, 3)
+0.3333333333333333333333333333333333333333
+>>> print atan(1) * 4
+3.141592653589793238462643383279502884197
+>>> add(Decimal('1.5'), 2j)
+(1.5+2j)
+>>> set_backend(FloatBackend())
+>>> div(1, 4)
+0.25
+"""
+from __future__ import division
+
+import math
+import operator
+import decimal
+from decimal import Decimal
+
+class FloatBackend(object):
+    '''
+    Python floats and math module functions
+    '''
+    digits = 0
+
+    real = float
+    add = staticmethod(operator.add)
+    sub = staticmethod(operator.sub)
+    mul = staticmethod(operator.mul)
+    div = staticmethod(operator.truediv)
+    pow = staticmethod(operator.pow)
+
+    def number(self, x):
+        if isinstance(x, Decimal):
+            return float(x)
+        return x
+
+    def pi(self):
+        return math.pi
+
+    def e(self):
+        return math.e
+
+    sqrt = staticmethod(math.sqrt)
+    exp = staticmethod(math.exp)
+    ln = staticmethod(math.log)
+    log = staticmethod(math.log)
+
+    sin = staticmethod(math.sin)
+    cos = staticmethod(math.cos)
+    tan = staticmethod(math.tan)
+    cot = staticmethod(lambda a: 1 / math.tan(a))
+
+    asin = staticmethod(math.asin)
+    acos = staticmethod(math.acos)
+    atan = staticmethod(math.atan)
+    acot = staticmethod(lambda a: math.atan(1 / a))
+    atan2 = staticmethod(math.atan2)
+
+    sinh = staticmethod(math.sinh)
+    cosh = staticmethod(math.cosh)
+    tanh = staticmethod(math.tanh)
+
+class DecimalBackend(object):
+    '''
+    decimal.Decimal numbers with given number of significant digits.
+    Activating the backend makes its context current decimal context,
+    so plain arithmetic operators are rounded to the same precision.
+    '''
+
+    def __init__(self, digits=28):
+        self.digits = int(digits)
+        self.context = decimal.Context(prec=self.digits)
+        self._pi = dict()
+
+    def activate(self):
+        decimal.setcontext(self.context)
+
+    def real(self, text):
+        return self.context.create_decimal(text)
+
+    def number(self, x):
+        '''
+        Turn native number into backend number, ints and complex
+        numbers are left as is (NaN is kept as is too, as it marks
+        start of list on the stack).
+        '''
+        if isinstance(x, float) and x == x:
+            return self.context.create_decimal(repr(x))
+        return x
+
+    def decimal(self, x):
+        if isinstance(x, Decimal):
+            return x
+        if isinstance(x, float):
+            return self.context.create_decimal(repr(x))
+        return Decimal(x)
+
+    def add(self, a, b):
+        if isinstance(a, complex) or isinstance(b, complex):
+            return complex(a) + complex(b)
+        return a + b
+
+    def sub(self, a, b):
+        if isinstance(a, complex) or isinstance(b, complex):
+            return complex(a) - complex(b)
+        return a - b
+
+    def mul(self, a, b):
+        if isinstance(a, complex) or isinstance(b, complex):
+            return complex(a) * complex(b)
+        return a * b
+
+    def div(self, a, b):
+        if isinstance(a, complex) or isinstance(b, complex):
+            return complex(a) / complex(b)
+        return self.decimal(a) / b
+
+    def pow(self, a, b):
+        if isinstance(a, complex) or isinstance(b, complex):
+            return complex(a) ** complex(b)
+        if isinstance(a, (int, long)) and isinstance(b, (int, long)) and b >= 0:
+            return a ** b
+        return self.decimal(a) ** self.decimal(b)
+
+    def _extra(self, digits):
+        '''
+        Add guard digits to context precision, return the old precision
+        '''
+        prec = self.context.prec
+        self.context.prec += digits
+        return prec
+
+    def pi(self):
+        try:
+            return self._pi[self.context.prec]
+        except KeyError:
+            pass
+
+        prec = self._extra(2)
+        try:
+            three = Decimal(3)
+            lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+            while s != lasts:
+                lasts = s
+                n, na = n + na, na + 8
+                d, da = d + da, da + 32
+                t = (t * n) / d
+                s += t
+        finally:
+            self.context.prec = prec
+
+        s = self._pi[prec] = +s
+        return s
+
+    def e(self):
+        return self.exp(1)
+
+    def sqrt(self, x):
+        return self.decimal(x).sqrt()
+
+    def _exp(self, x):
+        '''
+        Exponent by Taylor series of x / 2 ** k, |x / 2 ** k| <= 1,
+        squared k times
+
+        >>> backend = DecimalBackend(30)
+        >>> backend.activate()
+        >>> print backend._exp(1), backend._exp(-20)
+        2.71828182845904523536028747135 2.06115362243855782796594038016E-9
+        '''
+        x = self.decimal(x)
+        # Error of x is multiplied by x in exp(x), every squaring
+        # doubles relative error
+        halvings = max(x.adjusted() * 10 // 3 + 4, 0)
+        prec = self._extra(max(x.adjusted() + 1, 0) + halvings // 3 + 3)
+        try:
+            x /= 2 ** halvings
+            lasts, s, t, n = 0, 1 + x, x, 1
+            while s != lasts:
+                lasts = s
+                n += 1
+                t = t * x / n
+                s += t
+            for i in xrange(halvings):
+                s *= s
+        finally:
+            self.context.prec = prec
+        return +s
+
+    def _ln(self, x):
+        '''
+        Natural logarithm by Halley's method starting from float
+        logarithm: y = y + 2 * (x - exp(y)) / (x + exp(y))
+
+        >>> backend = DecimalBackend(30)
+        >>> backend.activate()
+        >>> print backend._ln(10), backend._ln(Decimal('1E-400'))
+        2.30258509299404568401799145468 -921.034037197618273607196581874
+        '''
+        x = self.decimal(x)
+        if x <= 0:
+            raise ValueError('math domain error')
+        if x == 1:
+            return Decimal(0)
+
+        power = x.adjusted()
+        y = Decimal(repr(math.log(float(significand(x))) + power * math.log(10)))
+
+        # ln(x) is close to 0 for x close to 1, x - exp(y) loses digits
+        prec = self._extra(max(-(x - 1).adjusted(), 0) + 3)
+        try:
+            # Float gives about 15 digits, every step triples them
+            digits = 15
+            while True:
+                a = self._exp(y)
+                y += 2 * (x - a) / (x + a)
+                if digits >= self.context.prec:
+                    break
+                digits *= 3
+        finally:
+            self.context.prec = prec
+        return +y
+
+    # Decimal.exp() and Decimal.ln() are available since Python 2.6
+    if hasattr(Decimal, 'exp'):
+        def exp(self, x):
+            return self.decimal(x).exp()
+
+        def ln(self, x):
+            return self.decimal(x).ln()
+    else:
+        exp = _exp
+        ln = _ln
+
+    def log(self, x, base):
+        prec = self._extra(2)
+        try:
+            r = self.ln(x) / self.ln(base)
+        finally:
+            self.context.prec = prec
+        return +r
+
+    def _series(self, x, i, s):
+        '''
+        Sum of sin/cos Taylor series, x is already reduced to [-π, π]
+        '''
+        lasts, fact, num, sign = 0, 1, s, 1
+        while s != lasts:
+            lasts = s
+            i += 2
+            fact *= i * (i - 1)
+            num *= x * x
+            sign = -sign
+            s += num / fact * sign
+        return s
+
+    def _reduce(self, x):
+        return self.decimal(x).remainder_near(2 * self.pi())
+
+    def sin(self, x):
+        prec = self._extra(2)
+        try:
+            x = self._reduce(x)
+            s = self._series(x, 1, x)
+        finally:
+            self.context.prec = prec
+        return +s
+
+    def cos(self, x):
+        prec = self._extra(2)
+        try:
+            s = self._series(self._reduce(x), 0, Decimal(1))
+        finally:
+            self.context.prec = prec
+        return +s
+
+    def tan(self, x):
+        prec = self._extra(2)
+        try:
+            r = self.sin(x) / self.cos(x)
+        finally:
+            self.context.prec = prec
+        return +r
+
+    def cot(self, x):
+        prec = self._extra(2)
+        try:
+            r = self.cos(x) / self.sin(x)
+        finally:
+            self.context.prec = prec
+        return +r
+
+    def atan(self, x):
+        x = self.decimal(x)
+        prec = self._extra(3)
+        try:
+            negative, x = x < 0, abs(x)
+            inverse = x > 1
+            if inverse:
+                x = 1 / x
+
+            # atan(x) = 2 * atan(x / (1 + sqrt(1 + x²)))
+            halvings = 0
+            while x > Decimal('0.1'):
+                x = x / (1 + (1 + x * x).sqrt())
+                halvings += 1
+
+            lasts, s, t, n, x2 = 0, x, x, 1, x * x
+            while s != lasts:
+                lasts = s
+                t *= -x2
+                n += 2
+                s += t / n
+            s *= 2 ** halvings
+
+            if inverse:
+                s = self.pi() / 2 - s
+            if negative:
+                s = -s
+        finally:
+            self.context.prec = prec
+        return +s
+
+    def asin(self, x):
+        x = self.decimal(x)
+        if abs(x) > 1:
+            raise ValueError('math domain error')
+        if abs(x) == 1:
+            return x * self.pi() / 2
+
+        prec = self._extra(2)
+        try:
+            r = self.atan(x / (1 - x * x).sqrt())
+        finally:
+            self.context.prec = prec
+        return +r
+
+    def acos(self, x):
+        prec = self._extra(2)
+        try:
+            r = self.pi() / 2 - self.asin(x)
+        finally:
+            self.context.prec = prec
+        return +r
+
+    def acot(self, x):
+        return self.atan(1 / self.decimal(x))
+
+    def atan2(self, y, x):
+        y, x = self.decimal(y), self.decimal(x)
+        if x > 0:
+            return self.atan(y / x)
+        if x < 0:
+            prec = self._extra(2)
+            try:
+                r = self.atan(y / x) + (self.pi() if y >= 0 else -self.pi())
+            finally:
+                self.context.prec = prec
+            return +r
+        if y:
+            return self.pi() / 2 * (1 if y > 0 else -1)
+        return Decimal(0)
+
+    def sinh(self, x):
+        x = self.decimal(x)
+        prec = self._extra(2)
+        try:
+            r = (self.exp(x) - self.exp(-x)) / 2
+        finally:
+            self.context.prec = prec
+        return +r
+
+    def cosh(self, x):
+        x = self.decimal(x)
+        prec = self._extra(2)
+        try:
+            r = (self.exp(x) + self.exp(-x)) / 2
+        finally:
+            self.context.prec = prec
+        return +r
+
+    def tanh(self, x):
+        x = self.decimal(x)
+        prec = self._extra(2)
+        try:
+            a, b = self.exp(x), self.exp(-x)
+            r = (a - b) / (a + b)
+        finally:
+            self.context.prec = prec
+        return +r
+
+def significand(x):
+    '''
+    Decimal |x| scaled to [1, 10), Decimal.scaleb() is not available
+    in Python 2.5
+    '''
+    sign, digits, exponent = x.as_tuple()
+    return Decimal((0, digits, 1 - len(digits)))
+
+backend = FloatBackend()
+
+def get_backend():
+    return backend
+
+def set_backend(new_backend):
+    global backend
+    backend = new_backend
+    activate = getattr(new_backend, 'activate', None)
+    if activate:
+        activate()
+
+def backend_for(digits):
+    '''
+    Make backend for number of significant digits, 0 means floats
+    '''
+    if int(digits) > 0:
+        return DecimalBackend(digits)
+    return FloatBackend()
+
+# Functions below are used by operations and forward to current backend
+
+def add(a, b):
+    return backend.add(a, b)
+
+def sub(a, b):
+    return backend.sub(a, b)
+
+def mul(a, b):
+    return backend.mul(a, b)
+
+def div(a, b):
+    return backend.div(a, b)
+
+def pow(a, b):
+    return backend.pow(a, b)
+
+def pi():
+    return backend.pi()
+
+def e():
+    return backend.e()
+
+def sqrt(x):
+    return backend.sqrt(x)
+
+def exp(x):
+    return backend.exp(x)
+
+def ln(x):
+    return backend.ln(x)
+
+def log(x, base):
+    return backend.log(x, base)
+
+def sin(x):
+    return backend.sin(x)
+
+def cos(x):
+    return backend.cos(x)
+
+def tan(x):
+    return backend.tan(x)
+
+def cot(x):
+    return backend.cot(x)
+
+def asin(x):
+    return backend.asin(x)
+
+def acos(x):
+    return backend.acos(x)
+
+def atan(x):
+    return backend.atan(x)
+
+def acot(x):
+    return backend.acot(x)
+
+def atan2(y, x):
+    return backend.atan2(y, x)
+
+def sinh(x):
+    return backend.sinh(x)
+
+def cosh(x):
+    return backend.cosh(x)
+
+def tanh(x):
+    return backend.tanh(x)
@@ -1,8 +1,11 @@
 # coding: utf-8
 from __future__ import division
-from procalc.i18n import _
 
 import math
+import cmath
+
+from procalc.i18n import _
+from procalc import numeric
 
 OP_PRIO_MIN = -100
 OP_PRIO_MAX = 100
@@ -14,12 +17,26 @@ __ops__ = []
 
 nan = float('nan')
 inf = float('inf')
-native = lambda x: x
+
+def native(x):
+    '''
+    Argument type of operations taking numbers of any type as is
+    '''
+    return x
 
 class OperationError(ValueError):
+    '''
+    Operation failure, message of exception e is prefixed with the first
+    line of its docstring
+
+    >>> import decimal
+    >>> print OperationError(decimal.DivisionByZero('x / 0'))
+    Division by 0: x / 0.
+    '''
+
     def __init__(self, e):
         if isinstance(e, Exception):
-            message = e.__doc__ or ''
+            message = (e.__doc__ or '').strip().split('\n', 1)[0]
             if message.endswith('.'):
                 message = message[:-1] + ': '
             message += e.message
@@ -38,7 +55,7 @@ class OperationError(ValueError):
 def op_invoke(func, stack, args):
     try:
         result = func(*args)
-    except (ArithmeticError, ValueError), e:
+    except (ArithmeticError, ValueError, TypeError), e:
         raise OperationError(e)
 
     if result is None:
@@ -50,65 +67,396 @@ def op_invoke(func, stack, args):
         stack.push(result)
 
 
-def operation_on_stack(name, prio, assoc=OP_ASSOC_LEFT):
+def describe(wrapper, func, name, prio, assoc, pure=False):
+    '''
+    Set operation attributes of wrapper, name and docstring are those
+    of the wrapped func
+    '''
+    wrapper.op_name = str(name)
+    wrapper.op_prio = int(prio)
+    wrapper.op_asso = assoc
+    wrapper.op_pure = pure
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+def operation_on_stack(name, prio, assoc=OP_ASSOC_LEFT, ops=__ops__):
     def decorator(func):
         func.op_name = str(name)
         func.op_prio = int(prio)
         func.op_asso = assoc
-        __ops__.append(func)
+        ops.append(func)
         return func
     return decorator
 
-def operation(name, prio, *types, **kw):
-    assoc = kw.get('assoc', OP_ASSOC_LEFT)
+def dispatcher(name, func, types, results=1):
+    '''
+    Make stack operation calling func with arguments popped from the
+    stack and coerced to types.  Arity, coercions (native ones are
+    skipped) and result shape are fixed here, so operations of one and
+    two arguments returning one value are called without building
+    argument lists:
+
+    >>> from procalc.stack import OpStack
+    >>> stack = OpStack()
+    >>> stack.push(7); stack.push(2)
+    >>> dispatcher('-', lambda a, b: a - b, (native, int))(stack)
+    >>> stack.pop()
+    5
+    >>> stack.push(1j)
+    >>> dispatcher('~', lambda a: ~a, (int,))(stack)
+    Traceback (most recent call last):
+    ...
+    OperationError: Arguments type mismatch for ~(int).
+    '''
+    arity = len(types)
+    coerce = tuple(None if t is native else t for t in types)
+
+    def mismatch():
+        return OperationError(_(u"Arguments type mismatch for %s(%s)") % (name, ", ".join(map(lambda t: t.__name__, types))))
+
+    if arity == 1 and results == 1:
+        t0, = coerce
 
-    def decorator(func):
-        rtypes = tuple(reversed(types))
+        def wrapper(stack):
+            a = stack.pop_value()
+            if t0:
+                try:
+                    a = t0(a)
+                except (ValueError, TypeError):
+                    raise mismatch()
+
+            try:
+                result = func(a)
+            except (ArithmeticError, ValueError, TypeError), e:
+                raise OperationError(e)
+            stack.push(result)
+
+    elif arity == 2 and results == 1:
+        t0, t1 = coerce
 
         def wrapper(stack):
+            # Errors of operations evaluated by pop_value() are not type
+            # mismatches
+            b = stack.pop_value()
+            a = stack.pop_value()
+            try:
+                if t1:
+                    b = t1(b)
+                if t0:
+                    a = t0(a)
+            except (ValueError, TypeError):
+                raise mismatch()
+
             try:
-                args = list()
-                for t in rtypes:
-                    args.insert(0, t(stack.pop_op()))
-            except ValueError:
-                raise OperationError(_(u"Arguments type mismatch for %s(%s)") % (name, ", ".join(map(lambda t: t.__name__, types))))
+                result = func(a, b)
+            except (ArithmeticError, ValueError, TypeError), e:
+                raise OperationError(e)
+            stack.push(result)
 
+    else:
+        rtypes = tuple(reversed(types))
+
+        def wrapper(stack):
+            args = list()
+            for t in rtypes:
+                # Errors of operations evaluated by pop_value() are not
+                # type mismatches
+                value = stack.pop_value()
+                try:
+                    args.append(t(value))
+                except (ValueError, TypeError):
+                    raise mismatch()
+
+            args.reverse()
             op_invoke(func, stack, args)
 
-        wrapper.op_name = str(name)
-        wrapper.op_prio = int(prio)
-        wrapper.op_asso = assoc
-        wrapper.__name__ = func.__name__
-        wrapper.__doc__ = func.__doc__
-        __ops__.append(wrapper)
+    wrapper.op_func = func
+    wrapper.op_arity = arity
+    wrapper.op_types = types
+    wrapper.op_results = results
+    return wrapper
+
+def operation(name, prio, *types, **kw):
+    '''
+    Register func as operation of types arguments, results keyword
+    argument is the number of values func returns (tuple for more than
+    one value), pure is false for functions which results depend on
+    anything but their arguments and the numeric backend
+    '''
+    assoc = kw.get('assoc', OP_ASSOC_LEFT)
+    ops = kw.get('ops', __ops__)
+    results = kw.get('results', 1)
+    pure = kw.get('pure', True)
+
+    def decorator(func):
+        wrapper = describe(dispatcher(name, func, types, results), func, name, prio, assoc, pure)
+        ops.append(wrapper)
         return wrapper
     return decorator
 
-def operation_for_list(name, prio, type_, assoc=OP_ASSOC_LEFT):
+def operation_for_list(name, prio, type_, assoc=OP_ASSOC_LEFT, ops=__ops__):
     def decorator(func):
         def wrapper(stack):
-            try:
-                args = list()
-                while stack:
-                    item = stack.pop_op()
-                    if item is nan:
-                        break
-                    args.insert(0, type_(item))
-            except ValueError:
-                raise OperationError(_(u"Argument type mismatch for %s(%s, ...)") % (name, type_.__name__))
-
+            args = list()
+            while stack:
+                item = stack.pop_value()
+                if item is nan:
+                    break
+                try:
+                    args.append(type_(item))
+                except (ValueError, TypeError):
+                    raise OperationError(_(u"Argument type mismatch for %s(%s, ...)") % (name, type_.__name__))
+
+            args.reverse()
             op_invoke(func, stack, args)
 
-        wrapper.op_name = str(name)
-        wrapper.op_prio = int(prio)
-        wrapper.op_asso = assoc
-        wrapper.__name__ = func.__name__
-        wrapper.__doc__ = func.__doc__
-        __ops__.append(wrapper)
+        describe(wrapper, func, name, prio, assoc)
+        ops.append(wrapper)
         return wrapper
     return decorator
 
 
+def reduction(name, prio, type_, *types, **kw):
+    '''
+    Make list operation of a reducer class.  List items are fed one by
+    one to reducer add() from the top of the stack down to the start
+    of list, so the list is never collected.  Then reducer result()
+    gets arguments of types taken from under the list:
+
+    >>> from procalc.stack import OpStack
+    >>> stack = OpStack(float, *__ops__)
+    >>> def evaluate(tokens):
+    ...     for token in tokens.split():
+    ...         stack.push(token)
+    ...     return stack.pop_op()
+    >>> evaluate('[‥] 1e100 1 -1e100 Σ')
+    1.0
+    >>> evaluate('[‥] 2 4 4 4 5 5 7 9 σ')
+    2.0
+    >>> evaluate('[‥] 3 1 4 2 med'), evaluate('90 [‥] 1 2 3 4 5 pct')
+    (2.5, 4.6)
+
+    Errors of operations evaluated to get the arguments are reported as
+    they are:
+
+    >>> evaluate('1 0 / [‥] 5 pct') # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    OperationError: Second argument to a division or modulo operation was zero...
+    '''
+    assoc = kw.get('assoc', OP_ASSOC_LEFT)
+    ops = kw.get('ops', __ops__)
+
+    def decorator(cls):
+        rtypes = tuple(reversed(types))
+
+        def wrapper(stack):
+            reducer = cls()
+            add = reducer.add
+            while stack:
+                item = stack.pop_value()
+                if item is nan:
+                    break
+
+                try:
+                    item = type_(item)
+                except (ValueError, TypeError):
+                    raise OperationError(_(u"Argument type mismatch for %s(%s, ...)") % (name, type_.__name__))
+
+                try:
+                    add(item)
+                except (ArithmeticError, ValueError, TypeError), e:
+                    raise OperationError(e)
+
+            args = list()
+            for t in rtypes:
+                value = stack.pop_value()
+                try:
+                    args.insert(0, t(value))
+                except (ValueError, TypeError):
+                    raise OperationError(_(u"Arguments type mismatch for %s(%s)") % (name, ", ".join(map(lambda t: t.__name__, types))))
+
+            op_invoke(reducer.result, stack, args)
+
+        describe(wrapper, cls, name, prio, assoc)
+        ops.append(wrapper)
+        return wrapper
+    return decorator
+
+class Sum(object):
+    '''
+    Compensated (Neumaier) sum
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.total = self.compensation = 0
+
+    def add(self, x):
+        total = self.total
+        t = total + x
+        if abs(total) >= abs(x):
+            self.compensation += (total - t) + x
+        else:
+            self.compensation += (x - t) + total
+        self.total = t
+        self.count += 1
+
+    def result(self):
+        compensation = self.compensation
+        # Infinite totals leave NaN compensation
+        if compensation != compensation:
+            return self.total
+        return self.total + compensation
+
+class Product(object):
+
+    def __init__(self):
+        self.product = 1
+
+    def add(self, x):
+        self.product *= x
+
+    def result(self):
+        return self.product
+
+class Mean(Sum):
+
+    def result(self):
+        return numeric.div(Sum.result(self), self.count)
+
+class GeometricMean(object):
+    '''
+    Geometric mean computed as mean of logarithms, so that the product
+    of items never overflows.  Binary exponents of floats are summed
+    apart from logarithms of their mantissas to keep precision.
+    '''
+
+    def __init__(self):
+        self.logs = Sum()
+        self.count = self.exponent = 0
+        self.negative = self.zero = False
+
+    def add(self, x):
+        self.count += 1
+        if isinstance(x, complex):
+            self.logs.add(cmath.log(x))
+            return
+
+        if not x:
+            self.zero = True
+            return
+
+        if x < 0:
+            self.negative = not self.negative
+            x = -x
+
+        if isinstance(x, (int, long)) and not numeric.get_backend().digits:
+            try:
+                x = float(x)
+            except OverflowError:
+                pass
+
+        if isinstance(x, float):
+            x, exponent = math.frexp(x)
+            self.exponent += exponent
+        self.logs.add(numeric.ln(x))
+
+    def result(self):
+        count = self.count
+        if self.zero:
+            return 0
+
+        mean = numeric.div(self.logs.result(), count)
+        if isinstance(mean, complex):
+            r = cmath.exp(mean)
+        else:
+            r = numeric.exp(mean)
+
+        if self.exponent:
+            if isinstance(r, float):
+                q, rem = divmod(self.exponent, count)
+                r = math.ldexp(r * 2 ** (rem / count), q)
+            else:
+                r *= numeric.pow(2, numeric.div(self.exponent, count))
+
+        if self.negative:
+            # Odd roots of negative numbers are not real, like powers
+            r *= numeric.pow(-1, numeric.div(1, count))
+        return r
+
+class StandardDeviation(object):
+    '''
+    Population standard deviation, single pass (Welford's algorithm)
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.mean = self.m2 = 0
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += numeric.div(delta, self.count)
+        self.m2 += delta * (x - self.mean)
+
+    def result(self):
+        return numeric.sqrt(numeric.div(self.m2, self.count))
+
+class Minimum(object):
+
+    def __init__(self):
+        self.value = None
+
+    def add(self, x):
+        if self.value is None or x < self.value:
+            self.value = x
+
+    def result(self):
+        if self.value is None:
+            raise ValueError(_(u'List is empty'))
+        return self.value
+
+class Maximum(Minimum):
+
+    def add(self, x):
+        if self.value is None or x > self.value:
+            self.value = x
+
+class Percentile(object):
+    '''
+    Percentile with linear interpolation between closest ranks, items
+    are kept until the list is over
+    '''
+
+    def __init__(self):
+        self.values = list()
+
+    def add(self, x):
+        self.values.append(x)
+
+    def result(self, rank):
+        values = self.values
+        if not values:
+            raise ValueError(_(u'List is empty'))
+        if not 0 <= rank <= 100:
+            raise ValueError(_(u'Percentile rank must be between 0 and 100'))
+
+        values.sort()
+        k = rank * (len(values) - 1)
+        i = int(k // 100)
+        fraction = k - i * 100
+        if not fraction:
+            return values[i]
+        return values[i] + (values[i + 1] - values[i]) * numeric.div(fraction, 100)
+
+class Median(Percentile):
+
+    def result(self):
+        return Percentile.result(self, 50)
+
+
 @operation_on_stack('[‥]', OP_PRIO_MIN)
 def op_start_of_list(stack):
     stack.push(nan)
@@ -122,44 +470,32 @@ def op_operand(stack):
     pass
 
 
-@operation_for_list('Σ', -2, native)
-def op_sum(*args):
-    return sum(args)
-
-@operation_for_list('Π', -1, native)
-def op_prod(*args):
-    return reduce(lambda x, y: x * y, args, 1)
-
-@operation_for_list('μ', -3, native)
-def op_mean(*args):
-    return sum(args) / len(args)
-
-@operation_for_list('gμ', -3, native)
-def op_gmean(*args):
-    return pow(reduce(lambda a, b: a * b, args), 1 / len(args))
-
-@operation_for_list('σ', -3, native)
-def op_stdev(*args):
-    mean = sum(args) / len(args)
-    disp = sum((x - mean) ** 2 for x in args) / len(args)
-    return math.sqrt(disp)
+op_sum = reduction('Σ', -2, native)(Sum)
+op_prod = reduction('Π', -1, native)(Product)
+op_mean = reduction('μ', -3, native)(Mean)
+op_gmean = reduction('gμ', -3, native)(GeometricMean)
+op_stdev = reduction('σ', -3, native)(StandardDeviation)
+op_min = reduction('min', -3, native)(Minimum)
+op_max = reduction('max', -3, native)(Maximum)
+op_median = reduction('med', -3, native)(Median)
+op_percentile = reduction('pct', -3, native, native)(Percentile)
 
 
 @operation('+', 1, native, native)
 def op_add(a, b):
-    return a + b
+    return numeric.add(a, b)
 
 @operation('−', 1, native, native)
 def op_sub(a, b):
-    return a - b
+    return numeric.sub(a, b)
 
 @operation('*', 2, native, native)
 def op_mul(a, b):
-    return a * b
+    return numeric.mul(a, b)
 
 @operation('/', 2, native, native)
 def op_div(a, b):
-    return a / b
+    return numeric.div(a, b)
 
 @operation('%', 2, int, int)
 def op_mod(a, b):
@@ -167,7 +503,7 @@ def op_mod(a, b):
 
 @operation('↑', 3, native, native, assoc=OP_ASSOC_RIGHT)
 def op_pow(a, b):
-    return a ** b
+    return numeric.pow(a, b)
 
 @operation('^', 2, int, int)
 def op_xor(a, b):
@@ -199,32 +535,32 @@ def op_shl(a, b):
 
 @operation('1/x', 2, native)
 def op_inv(a):
-    return 1 / a
+    return numeric.div(1, a)
 
 @operation_on_stack('π', OP_PRIO_MAX)
 def op_pi(stack):
-    return stack.push(math.pi)
+    return stack.push(numeric.pi())
 
 @operation_on_stack('e', OP_PRIO_MAX)
 def op_e(stack):
-    return stack.push(math.e)
+    return stack.push(numeric.e())
 
-op_sin = operation('sin', 5, native)(math.sin)
-op_asin = operation('asin', 5, native)(math.asin)
-op_sinh = operation('sinh', 5, native)(math.sinh)
+op_sin = operation('sin', 5, native)(numeric.sin)
+op_asin = operation('asin', 5, native)(numeric.asin)
+op_sinh = operation('sinh', 5, native)(numeric.sinh)
 
-op_cos = operation('cos', 5, native)(math.cos)
-op_acos = operation('acos', 5, native)(math.acos)
-op_cosh = operation('cosh', 5, native)(math.cosh)
+op_cos = operation('cos', 5, native)(numeric.cos)
+op_acos = operation('acos', 5, native)(numeric.acos)
+op_cosh = operation('cosh', 5, native)(numeric.cosh)
 
-op_tan = operation('tan', 5, native)(math.tan)
-op_atan = operation('atan', 5, native)(math.atan)
-op_tanh = operation('tanh', 5, native)(math.tanh)
+op_tan = operation('tan', 5, native)(numeric.tan)
+op_atan = operation('atan', 5, native)(numeric.atan)
+op_tanh = operation('tanh', 5, native)(numeric.tanh)
 
-op_cot = operation('cot', 5, native)(lambda a: 1 / math.tan(a))
-op_acot = operation('acot', 5, native)(lambda a: math.atan(1 / a))
-op_atan2 = operation('atg2', 5, native, native)(math.atan2)
+op_cot = operation('cot', 5, native)(numeric.cot)
+op_acot = operation('acot', 5, native)(numeric.acot)
+op_atan2 = operation('atg2', 5, native, native)(numeric.atan2)
 
-op_log = operation('log', 5, native, int)(math.log)
-op_ln = operation('ln', 5, native)(math.log)
+op_log = operation('log', 5, native, int)(numeric.log)
+op_ln = operation('ln', 5, native)(numeric.ln)
 
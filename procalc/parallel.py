@@ -0,0 +1,138 @@
+# coding: utf-8
+"""
+Parallel batch evaluation.
+
+Expression files are split into shards by byte ranges aligned to line
+boundaries.  Worker processes evaluate shards, each worker has its own
+stack and converter configured from the same options as in the main
+process.  Results are merged back in input order, error messages get
+line numbers of the whole file:
+
+>>> import os, tempfile
+>>> from StringIO import StringIO
+>>> from procalc.batch import option_parser
+>>> options, files = option_parser().parse_args(['-p', '-1:-1'])
+>>> fd, filename = tempfile.mkstemp()
+>>> os.write(fd, ''.join('%d + 1\\n' % i for i in range(1000)))
+7890
+>>> os.close(fd)
+>>> output = StringIO()
+>>> evaluate_file(filename, options, 2, output)
+(1000, 0)
+>>> output.getvalue().split() == [str(i + 1) for i in range(1000)]
+True
+>>> os.unlink(filename)
+"""
+
+from __future__ import with_statement
+
+import os
+import sys
+import multiprocessing
+from cStringIO import StringIO
+
+from procalc.batch import BatchEvaluator, configure
+from procalc.converters import Converter
+from procalc.memo import Memo
+
+# Upper bound of shard size, results of a shard are kept in memory
+SHARD_SIZE = 1 << 22
+
+# Shards per worker, more shards balance the load better
+SHARDS_PER_JOB = 4
+
+def shards(filename, count, shard_size=SHARD_SIZE):
+    '''
+    Split file into at least count byte ranges (start, end) which
+    start at the beginning of a line
+    '''
+    size = os.path.getsize(filename)
+    count = max(count, size // shard_size + 1)
+
+    bounds = [0]
+    with open(filename, 'rb') as f:
+        for i in xrange(1, count):
+            f.seek(size * i // count)
+            f.readline()
+            bound = min(f.tell(), size)
+            if bound > bounds[-1]:
+                bounds.append(bound)
+
+    if size > bounds[-1]:
+        bounds.append(size)
+    return zip(bounds[:-1], bounds[1:])
+
+def shard_lines(f, start, end):
+    f.seek(start)
+    position = start
+    while position < end:
+        line = f.readline()
+        if not line:
+            break
+        position += len(line)
+        yield line
+
+class ShardEvaluator(BatchEvaluator):
+    '''
+    Batch evaluator collecting errors as (line number, message)
+    '''
+
+    def __init__(self, *args, **kw):
+        super(ShardEvaluator, self).__init__(*args, **kw)
+        self.failures = list()
+
+    def error(self, name, lineno, message):
+        self.failures.append((lineno, message))
+
+# Evaluator of a worker process
+_evaluator = None
+
+def init_worker(options):
+    global _evaluator
+    conv = Converter()
+    configure(conv, options)
+    memo = None
+    if options.memo:
+        memo = Memo(options.memo)
+    _evaluator = ShardEvaluator(conv, options.rpn, memo, options.fold)
+
+def evaluate_shard(task):
+    '''
+    Evaluate shard in worker process, return number of lines, number
+    of expressions, number of errors, output and error messages
+    '''
+    filename, start, end = task
+    evaluator = _evaluator
+    evaluator.count = evaluator.errors = 0
+    del evaluator.failures[:]
+
+    output = StringIO()
+    with open(filename, 'rb') as f:
+        lines = evaluator.run(shard_lines(f, start, end), output, filename)
+    return lines, evaluator.count, evaluator.errors, output.getvalue(), evaluator.failures
+
+def evaluate_file(filename, options, jobs, output, errors=sys.stderr):
+    '''
+    Evaluate expressions file in jobs worker processes, write results
+    to output in input order, return number of expressions and errors
+    '''
+    tasks = [(filename, start, end) for start, end in shards(filename, jobs * SHARDS_PER_JOB)]
+
+    pool = multiprocessing.Pool(jobs, init_worker, (options,))
+    try:
+        lineno = count = failed = 0
+        for lines, shard_count, shard_failed, text, failures in pool.imap(evaluate_shard, tasks):
+            output.write(text)
+            for n, message in failures:
+                errors.write('%s:%d: %s\n' % (filename, lineno + n, message))
+            lineno += lines
+            count += shard_count
+            failed += shard_failed
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return count, failed
@@ -0,0 +1,189 @@
+# coding: utf-8
+"""
+Radix conversion of huge integers.
+
+Python converts integers to and from decimal digits in quadratic
+time, which takes seconds for numbers of a hundred thousand digits
+and minutes for millions of digits.  Here numbers are split in halves
+by powers base ** (CHUNK * 2 ** i) recursively, down to chunks short
+enough for the built-in conversion:
+
+>>> n = 7 ** 20000
+>>> to_digits(n) == str(n)
+True
+>>> from_digits(str(n)) == n
+True
+>>> to_digits(-n) == str(-n), from_digits('000' + str(n)) == n
+(True, True)
+
+Halves are joined with multiplications, which are subquadratic
+(Karatsuba), and split with divisions by multiplication with
+reciprocals of the powers.  Powers and their reciprocals are computed
+once per base and kept in tables.
+
+Only decimal conversions need this, CPython converts integers to and
+from power of two bases in linear time.
+"""
+
+# Digits in the shortest chunk, and the longest number in digits
+# converted with built-in conversion
+CHUNK = 512
+
+FORMATS = {8: '%o', 10: '%d', 16: '%X'}
+
+# Numbers below are shorter than CHUNK digits in all bases
+SMALL = 1 << 3 * CHUNK
+
+# (digits, power, bits, reciprocal) per base, with power = base ** digits
+# of bits bit length and digits = CHUNK * 2 ** i at index i,
+# reciprocals are computed lazily
+tables = dict()
+
+# Unused leading bits of a hex digit
+HEX_PAD = dict(('%x' % i, (i < 8) + (i < 4) + (i < 2)) for i in range(1, 16))
+
+def bit_length(n):
+    '''
+    Number of bits of integer n > 0 (long.bit_length() is new in
+    Python 2.7), takes linear time
+
+    >>> bit_length(1), bit_length(255), bit_length(256)
+    (1, 8, 9)
+    '''
+    digits = '%x' % n
+    return len(digits) * 4 - HEX_PAD[digits[0]]
+
+def table_entry(digits, power):
+    return [digits, power, bit_length(power), None]
+
+def table(base, index):
+    '''
+    Powers table of base with at least index + 1 entries
+    '''
+    try:
+        powers = tables[base]
+    except KeyError:
+        powers = tables[base] = [table_entry(CHUNK, base ** CHUNK)]
+
+    while len(powers) <= index:
+        digits, power = powers[-1][:2]
+        powers.append(table_entry(digits * 2, power * power))
+    return powers
+
+def reciprocal(p):
+    '''
+    4 ** b // p, where b is bit length of p, by Newton iteration from
+    the reciprocal of the upper half of p
+
+    >>> p = 10 ** 2000
+    >>> reciprocal(p) == 4 ** bit_length(p) // p
+    True
+    '''
+    b = bit_length(p)
+    if b <= CHUNK * 8:
+        return (1 << 2 * b) // p
+
+    # Upper half q of p rounded up gives x a bit under 4 ** b // p
+    # with about k correct bits, Newton step doubles the number of
+    # correct bits
+    k = b // 2
+    q = (p >> k) + 1
+    x = reciprocal(q) << (2 * b - k - 2 * bit_length(q))
+    x += x * ((1 << 2 * b) - p * x) >> 2 * b
+
+    r = (1 << 2 * b) - p * x
+    while r < 0:
+        x -= 1
+        r += p
+    while r >= p:
+        x += 1
+        r -= p
+    return x
+
+def split(n, entry):
+    '''
+    divmod(n, power) of powers table entry, n < power ** 2
+    '''
+    digits, power, bits, inverse = entry
+    if inverse is None:
+        inverse = entry[3] = reciprocal(power)
+
+    q = n * inverse >> 2 * bits
+    r = n - q * power
+    while r >= power:
+        q += 1
+        r -= power
+    return q, r
+
+def to_digits(n, base=10):
+    '''
+    Digits of integer n in base 8, 10 or 16
+    '''
+    fmt = FORMATS[base]
+    if type(n) is int or -SMALL < n < SMALL:
+        return fmt % n
+    if n < 0:
+        return '-' + to_digits(-n, base)
+
+    powers = table(base, 0)
+
+    # n < 2 ** (2 * (b - 1)) <= power ** 2 for power of b bits
+    bits = bit_length(n)
+    index = 0
+    while bits > 2 * (powers[index][2] - 1):
+        index += 1
+        powers = table(base, index)
+
+    def convert(n, index, width):
+        if not width:
+            while index >= 0 and n < powers[index][1]:
+                index -= 1
+        if index < 0:
+            return (fmt % n).rjust(width, '0')
+
+        entry = powers[index]
+        high, low = split(n, entry)
+        digits = entry[0]
+        return convert(high, index - 1, max(width - digits, 0)) + convert(low, index - 1, digits)
+
+    return convert(n, index, 0)
+
+def formatter(base=10):
+    '''
+    to_digits() of base with the fast path for short numbers inlined
+    '''
+    fmt = FORMATS[base]
+
+    def digits(n):
+        if type(n) is int or -SMALL < n < SMALL:
+            return fmt % n
+        return to_digits(n, base)
+    return digits
+
+def from_digits(s, base=10):
+    '''
+    Integer of digits string s in base
+    '''
+    if len(s) <= CHUNK * 2:
+        return int(s, base)
+    if s[0] == '-':
+        return -from_digits(s[1:], base)
+    if s[0] == '+':
+        return from_digits(s[1:], base)
+
+    index = 0
+    powers = table(base, 0)
+    while powers[index][0] * 2 < len(s):
+        index += 1
+        powers = table(base, index)
+
+    def convert(s, index):
+        while index >= 0 and powers[index][0] >= len(s):
+            index -= 1
+        if index < 0:
+            return int(s, base)
+
+        digits, power = powers[index][:2]
+        return convert(s[:-digits], index) * power + convert(s[-digits:], index - 1)
+
+    return convert(s, index)
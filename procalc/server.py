@@ -0,0 +1,212 @@
+# coding: utf-8
+"""
+Calculator service.
+
+The server listens on a Unix socket and keeps a session, a stack with
+its own converter, for every connection.  Requests and responses are
+JSON objects, one per line.  Clients may send requests without waiting
+for responses, requests of a session are evaluated and answered in
+order:
+
+    {"id": 1, "cmd": "push", "arg": "2"}      {"id": 1, "result": null}
+    {"id": 2, "cmd": "push_op", "arg": "+"}   {"id": 2, "result": null}
+    {"id": 3, "cmd": "push", "arg": "0x10"}   {"id": 3, "result": null}
+    {"id": 4, "cmd": "pop_op"}                {"id": 4, "result": "18"}
+
+Commands are push, push_op, pop_op, as_str and clear, converter
+settings base, mode, precision and word are set with an argument and
+returned without one.  Failed requests get an error message instead
+of result:
+
+>>> session = Session()
+>>> session.handle('{"id": 1, "cmd": "push", "arg": "255"}')
+'{"id": 1, "result": null}'
+>>> session.handle('{"id": 2, "cmd": "base", "arg": 16}')
+'{"id": 2, "result": 16}'
+>>> session.handle('{"id": 3, "cmd": "as_str"}')
+'{"id": 3, "result": "0xFF"}'
+>>> session.handle('{"id": 4, "cmd": "push_op", "arg": "/"}')
+'{"id": 4, "result": null}'
+>>> session.handle('{"id": 5, "cmd": "pop_op"}')
+'{"id": 5, "error": "Stack is empty"}'
+>>> session.handle('{"id": 6, "cmd": "eval"}')
+'{"id": 6, "error": "Unknown command eval"}'
+>>> session.handle('{"id": 7, "cmd": "mode", "arg": 5}')
+'{"id": 7, "error": "Unknown view mode 5"}'
+>>> session.handle('{"id": 8, "cmd": "mode"}')
+'{"id": 8, "result": 0}'
+
+Numeric backend is process wide, so the number of significant digits
+is the same for all sessions and is set when the server starts.
+"""
+
+import os
+import sys
+import json
+import socket
+import asyncore
+import asynchat
+
+from procalc import operations
+from procalc.converters import Converter, format_char, mode_func
+from procalc.i18n import _
+from procalc.stack import OpStack, StackError
+
+# Pending connections the listening socket queues
+BACKLOG = 1024
+
+# Longest request line, sessions sending longer lines are closed
+MAX_LINE = 1 << 16
+
+class RequestError(ValueError):
+    pass
+
+class Session(object):
+    '''
+    Calculator state of one client
+    '''
+
+    def __init__(self, options=None):
+        self.conv = Converter()
+        if options is not None:
+            from procalc.batch import configure
+            configure(self.conv, options)
+        self.stack = OpStack(self.conv.parse, *operations.__ops__)
+
+    def cmd_push(self, arg):
+        self.stack.push(arg)
+
+    def cmd_push_op(self, arg):
+        self.stack.push_op(arg)
+
+    def cmd_pop_op(self, arg):
+        return self.conv.format(self.stack.pop_op())
+
+    def cmd_as_str(self, arg):
+        return self.stack.as_str(self.conv.format)
+
+    def cmd_clear(self, arg):
+        self.stack.clear()
+
+    def setting(name):
+        def command(self, arg):
+            if arg is not None:
+                setattr(self.conv, name, arg)
+            return getattr(self.conv, name)
+        return command
+
+    cmd_word = setting('word')
+
+    def cmd_base(self, arg):
+        if arg is not None:
+            base = int(arg)
+            if base >= 0 and base not in format_char:
+                raise RequestError(_(u'Unknown base %s') % arg)
+            self.conv.base = base
+        return self.conv.base
+
+    def cmd_mode(self, arg):
+        if arg is not None:
+            mode = int(arg)
+            if not 0 <= mode < len(mode_func):
+                raise RequestError(_(u'Unknown view mode %s') % arg)
+            self.conv.mode = mode
+        return self.conv.mode
+
+    def cmd_precision(self, arg):
+        if arg is not None:
+            self.conv.precision = str(arg).split(':')
+        return '%d:%d' % tuple(self.conv.precision)
+
+    del setting
+
+    def handle(self, line):
+        '''
+        Evaluate request line, return response line
+        '''
+        id_ = None
+        try:
+            try:
+                request = json.loads(line)
+                id_ = request.get('id')
+                cmd = request['cmd']
+                command = getattr(self, 'cmd_' + cmd, None)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                raise RequestError(_(u'Malformed request'))
+
+            if command is None:
+                raise RequestError(_(u'Unknown command %s') % cmd)
+            result = command(request.get('arg'))
+
+        except (StackError, ValueError, TypeError, ArithmeticError, LookupError), e:
+            return '{"id": %s, "error": %s}' % (json.dumps(id_), json.dumps(unicode(e.message)))
+
+        return '{"id": %s, "result": %s}' % (json.dumps(id_), json.dumps(result))
+
+class Connection(asynchat.async_chat):
+
+    def __init__(self, sock, session, map_=None):
+        asynchat.async_chat.__init__(self, sock, map_)
+        self.set_terminator('\n')
+        self.session = session
+        self.data = list()
+        self.size = 0
+
+    def collect_incoming_data(self, data):
+        self.size += len(data)
+        if self.size > MAX_LINE:
+            self.close()
+        else:
+            self.data.append(data)
+
+    def found_terminator(self):
+        line = ''.join(self.data)
+        del self.data[:]
+        self.size = 0
+        if line.strip():
+            self.push(self.session.handle(line) + '\n')
+
+    def handle_error(self):
+        self.close()
+
+class Server(asyncore.dispatcher):
+
+    def __init__(self, path, options=None, map_=None):
+        asyncore.dispatcher.__init__(self, map=map_)
+        self.options = options
+        self.map = map_
+        self.path = path
+
+        self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.path.exists(path):
+            os.unlink(path)
+        self.bind(path)
+        self.listen(BACKLOG)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            Connection(pair[0], Session(self.options), self.map)
+
+    def close(self):
+        asyncore.dispatcher.close(self)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+def serve(path, options=None):
+    '''
+    Serve sessions on Unix socket path until interrupted
+    '''
+    map_ = dict()
+    server = Server(path, options, map_)
+    try:
+        # poll() is not limited to FD_SETSIZE connections like select()
+        asyncore.loop(map=map_, use_poll=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        asyncore.close_all(map_)
+
+if __name__ == '__main__':
+    serve(sys.argv[1])
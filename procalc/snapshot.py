@@ -0,0 +1,197 @@
+# coding: utf-8
+"""
+Stack snapshots.
+
+Snapshot is a compact binary image of OpStack contents.  Stack entries
+are stored as runs of entries of the same type, so long runs of
+numbers are packed into arrays and loaded in one go:
+
+>>> import os, tempfile
+>>> from procalc.stack import OpStack
+>>> from procalc.operations import __ops__, nan
+>>> stack = OpStack(None, *__ops__)
+>>> for x in (1, 2 ** 100, 0.5, 1.5, 2j, nan, '+'):
+...     stack.push(x)
+>>> filename = os.path.join(tempfile.mkdtemp(), 'session.bin')
+>>> save(stack, filename)
+>>> restored = OpStack(None, *__ops__)
+>>> load(restored, filename)
+>>> [restored.get(i) for i in reversed(range(len(restored)))] # doctest: +ELLIPSIS
+[1, 1267650600228229401496703205376L, 0.5, 1.5, 2j, nan, <function op_add at ...>]
+>>> restored.get(1) is nan
+True
+
+Integers are wrapped to the current word size if wrap function is
+given, other values are restored as they were saved:
+
+>>> from procalc.converters import Converter
+>>> conv = Converter()
+>>> conv.word = 'int8'
+>>> wrapped = OpStack(conv.parse, *__ops__)
+>>> load(wrapped, filename, conv.wrap)
+>>> wrapped.get(6), wrapped.get(5), wrapped.get(4)
+(1, 0L, 0.5)
+
+File layout (little endian):
+
+header: magic 'PCSS', format version, number of stack runs and
+number of operations stack runs (uint32 each);
+
+run: type tag (char), number of entries and payload size (uint32),
+followed by payload: int64 or double array for 'q' and 'd' runs,
+pairs of doubles for 'c' runs, newline separated text for 'L'
+(long integers), 'D' (decimals) and 'o' (operations) runs, nothing
+for 'n' runs (start of list markers).
+"""
+
+from __future__ import with_statement
+
+import os
+import mmap
+import struct
+import tempfile
+from decimal import Decimal
+from itertools import groupby
+
+from procalc.i18n import _
+from procalc.operations import nan
+from procalc.stack import function
+
+MAGIC = 'PCSS'
+VERSION = 1
+
+HEADER = struct.Struct('<4sIII')
+RUN = struct.Struct('<cII')
+
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+class SnapshotError(ValueError):
+    pass
+
+def tag(x):
+    '''
+    Type tag of stack entry
+    '''
+    if isinstance(x, float):
+        return 'n' if x is nan else 'd'
+    if isinstance(x, (int, long)):
+        return 'q' if INT64_MIN <= x <= INT64_MAX else 'L'
+    if isinstance(x, complex):
+        return 'c'
+    if isinstance(x, Decimal):
+        return 'D'
+    if isinstance(x, function):
+        return 'o'
+    raise SnapshotError(_(u'Unsupported value type %s') % type(x).__name__)
+
+def pack_run(t, items):
+    if t == 'q' or t == 'd':
+        payload = struct.pack('<%d%s' % (len(items), t), *items)
+    elif t == 'c':
+        values = list()
+        for x in items:
+            values.append(x.real)
+            values.append(x.imag)
+        payload = struct.pack('<%dd' % len(values), *values)
+    elif t == 'L' or t == 'D':
+        payload = '\n'.join(map(str, items))
+    elif t == 'o':
+        payload = '\n'.join(o.op_name for o in items)
+    else:
+        payload = ''
+    return RUN.pack(t, len(items), len(payload)) + payload
+
+def unpack_array(t, payload):
+    size = struct.calcsize('<' + t)
+    if len(payload) % size:
+        raise SnapshotError(_(u'Snapshot is corrupt'))
+    return struct.unpack('<%d%s' % (len(payload) // size, t), payload)
+
+def unpack_run(stack, t, count, payload, wrap=None):
+    if t == 'q' or t == 'd':
+        values = unpack_array(t, payload)
+    elif t == 'c':
+        values = unpack_array('d', payload)
+        values = map(complex, values[::2], values[1::2])
+    elif t == 'L':
+        values = map(long, payload.split('\n'))
+    elif t == 'D':
+        values = map(Decimal, payload.split('\n'))
+    elif t == 'o':
+        values = map(stack.get_op, payload.split('\n'))
+    elif t == 'n':
+        values = [nan] * count
+    else:
+        raise SnapshotError(_(u'Unknown snapshot record type %s') % t)
+
+    if len(values) != count:
+        raise SnapshotError(_(u'Snapshot is corrupt'))
+    if wrap is not None and (t == 'q' or t == 'L'):
+        values = map(wrap, values)
+    return values
+
+def pack(items):
+    runs = [pack_run(t, list(run)) for t, run in groupby(items, tag)]
+    return len(runs), ''.join(runs)
+
+def save(stack, filename):
+    '''
+    Write stack snapshot to file atomically: snapshot is written into
+    temporary file in the same directory, which then replaces the file.
+    '''
+    entries, ops = stack.state()
+    stack_runs, stack_data = pack(entries)
+    ops_runs, ops_data = pack(ops)
+
+    fd, tmpname = tempfile.mkstemp(prefix='.session', dir=os.path.dirname(filename) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, stack_runs, ops_runs))
+            f.write(stack_data)
+            f.write(ops_data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmpname, filename)
+    except:
+        os.unlink(tmpname)
+        raise
+
+def load(stack, filename, wrap=None):
+    '''
+    Load stack snapshot from file, loaded entries are put under
+    current stack contents, integers are wrapped with wrap function
+    if it is given.  The file is mapped into memory and all runs are
+    decoded at once, every run with one struct call, so only integers
+    wrapped to a word size cost a Python call per entry.
+    '''
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            raise SnapshotError(_(u'Snapshot is corrupt'))
+
+        data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            magic, version, stack_runs, ops_runs = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                raise SnapshotError(_(u'Unknown snapshot format'))
+
+            offset = HEADER.size
+            sections = list()
+            for runs in (stack_runs, ops_runs):
+                values = list()
+                for i in xrange(runs):
+                    t, count, length = RUN.unpack_from(data, offset)
+                    offset += RUN.size
+                    if offset + length > size:
+                        raise SnapshotError(_(u'Snapshot is corrupt'))
+                    values.extend(unpack_run(stack, t, count, data[offset:offset + length], wrap))
+                    offset += length
+                sections.append(values)
+
+        except struct.error:
+            raise SnapshotError(_(u'Snapshot is corrupt'))
+
+        finally:
+            data.close()
+
+    stack.restore(*sections)
@@ -1,27 +1,210 @@
 from procalc.i18n import _
+from procalc import numeric
 
 function = type(lambda: 1)
 
+# Stack change events
+STACK_INSERT = 'insert'
+STACK_REMOVE = 'remove'
+STACK_REPLACE = 'replace'
+STACK_OPS = 'ops'
+
 class StackError(Exception):
     pass
 
 class StackUnderflowError(StackError, OverflowError):
     pass
 
+class Program(object):
+    """
+    Expression compiled by OpStack.compile(): a flat postfix sequence
+    of operations and normalized values with slots for named variables.
+    The program is immutable and can be executed repeatedly with new
+    variable bindings.
+    """
+    __slots__ = ('_code', '_slots')
+
+    def __init__(self, code, slots=()):
+        self._code = tuple(code)
+        self._slots = tuple(slots)
+
+    @property
+    def names(self):
+        return tuple(name for index, name in self._slots)
+
+    def bind(self, norm, bindings=None):
+        """
+        Get postfix code with variables replaced with normalized values
+        """
+        if not self._slots:
+            return self._code
+
+        bindings = bindings or {}
+        code = list(self._code)
+        for index, name in self._slots:
+            try:
+                code[index] = norm(bindings[name])
+            except KeyError:
+                raise StackError(_(u'Unbound variable %s') % name)
+        return code
+
+    def __len__(self):
+        return len(self._code)
+
 class OpStack(object):
     def __init__(self, guard=None, *ops):
         self._ops = dict(((o.op_name, o) for o in ops))
         self._guard = guard or (lambda x: x)
+        # Both stacks keep their top at the end of the list, so that
+        # every operation on the top is O(1).  Public indexes still count
+        # from the top (index 0 is the top of the stack).
         self._stack = list()
         self._opstack = list()
 
+        # Change tracking: stack entries below _low position are intact
+        # since listeners were notified last time, when stack length
+        # was _length.  Operations evaluated on the stack push and pop
+        # values freely, listeners are notified once evaluation is over.
+        self._listeners = list()
+        self._low = self._length = 0
+        self._opchanged = False
+        self._depth = 0
+
+        # Constant folding: results of operations folded while the
+        # current expression is pending, keyed on operation and
+        # arguments
+        self._folding = False
+        self._folds = dict()
+        self.folded = self.reused = 0
+
     def as_str(self, filter_=str):
         if self._opstack:
-            opstack = '[' + ', '.join(o.op_name for o in self._opstack) + ']\n'
+            opstack = self.ops_as_str() + '\n'
         else:
             opstack = ''
 
-        return opstack + '\n'.join(getattr(i, 'op_name', None) or filter_(i) for i in self._stack)
+        return opstack + '\n'.join(getattr(i, 'op_name', None) or filter_(i) for i in reversed(self._stack))
+
+    def ops_as_str(self):
+        if self._opstack:
+            return '[' + ', '.join(o.op_name for o in reversed(self._opstack)) + ']'
+        return ''
+
+    def connect(self, listener):
+        """
+        Call listener(changes) every time the stack is changed, changes
+        is a list of (event, index) pairs:
+
+        STACK_INSERT, STACK_REMOVE, STACK_REPLACE -- entry at index was
+        inserted, removed or replaced, indexes count from the top of the
+        stack and take preceding changes into account;
+
+        STACK_OPS -- operations stack was changed (index is None).
+
+        >>> stack = OpStack(int)
+        >>> stack.push(1); stack.push(2)
+        >>> def listener(changes):
+        ...     print changes
+        >>> stack.connect(listener)
+        >>> stack.push(3)
+        [('insert', 0)]
+        >>> stack.put(5, 1)
+        [('replace', 0), ('replace', 1)]
+        >>> stack.pop(2)
+        [('replace', 0), ('replace', 1), ('remove', 2)]
+        1
+        """
+        self._listeners.append(listener)
+        self._low = self._length = len(self._stack)
+        self._opchanged = False
+
+    def disconnect(self, listener):
+        self._listeners.remove(listener)
+
+    def _changed(self, position):
+        '''
+        Stack entries from position up were changed
+        '''
+        if position < self._low:
+            self._low = position
+        if not self._depth:
+            self._notify()
+
+    def _notify(self):
+        length = len(self._stack)
+        low = min(self._low, length)
+        removed, inserted = self._length - low, length - low
+
+        changes = list()
+        if self._opchanged:
+            changes.append((STACK_OPS, None))
+
+        replaced = min(removed, inserted)
+        changes.extend((STACK_REPLACE, i) for i in xrange(replaced))
+        if removed > inserted:
+            changes.extend((STACK_REMOVE, replaced) for i in xrange(removed - replaced))
+        else:
+            changes.extend((STACK_INSERT, i) for i in xrange(replaced, inserted))
+
+        self._low = self._length = length
+        self._opchanged = False
+
+        if changes:
+            for listener in self._listeners:
+                listener(changes)
+
+    def instrument(self, profiler):
+        """
+        Count and time stack methods and operations with profiler,
+        call before compiling or pushing operations
+        """
+        self._ops = dict((name, profiler.operation(op, self)) for name, op in self._ops.iteritems())
+        for name in ('push', 'push_op', 'pop_op', 'execute'):
+            setattr(self, name, profiler.timed('stack.' + name, getattr(self, name), self))
+
+    def optimize(self, folding=True):
+        """
+        Fold constant subexpressions: pure operations pushed with
+        push_op() are evaluated as soon as all their arguments are
+        values, identical subexpressions of a pending expression are
+        evaluated once.  Numbers of operations folded and reused are
+        counted in folded and reused attributes.
+
+        >>> from procalc.operations import __ops__
+        >>> stack = OpStack(int, *__ops__)
+        >>> stack.optimize()
+        >>> for token in '2 * 3 + 2 * 3 + 1'.split():
+        ...     stack.push_op(token)
+        >>> stack.as_str()
+        '[+]\\n1\\n12'
+        >>> stack.folded, stack.reused
+        (2, 1)
+        >>> stack.pop_op()
+        13
+
+        Results for zero arguments are not reused:
+
+        >>> stack = OpStack(float, *__ops__)
+        >>> stack.optimize()
+        >>> for token in 'atg2 0.0 -1.0 + atg2 -0.0 -1.0 + 0'.split():
+        ...     stack.push_op(token)
+        >>> stack.pop_op(), stack.reused
+        (0.0, 0)
+
+        Nor are results got with another numeric backend:
+
+        >>> stack = OpStack(int, *__ops__)
+        >>> stack.optimize()
+        >>> for token in '1 / 3 +'.split():
+        ...     stack.push_op(token)
+        >>> numeric.set_backend(numeric.DecimalBackend(10))
+        >>> for token in '1 / 3 +'.split():
+        ...     stack.push_op(token)
+        >>> numeric.set_backend(numeric.FloatBackend())
+        >>> stack.reused
+        0
+        """
+        self._folding = folding
 
     def add_op(self, op):
         self._ops[op.op_name] = op
@@ -40,46 +223,91 @@ class OpStack(object):
         return opname in self._ops
 
     def norm(self, value):
-        if value is None or value == '':
+        if isinstance(value, basestring):
+            if not value:
+                raise StackError(_(u'No empty values allowed on the stack'))
+            op = self._ops.get(value, None)
+            if op:
+                return op
+
+        elif value is None:
             raise StackError(_(u'No empty values allowed on the stack'))
-        return self._ops.get(value, None) or self._guard(value)
+
+        return self._guard(value)
 
     def pop(self, index=0):
         """
         Pop value from stack (like get()+drop())
         """
         try:
-            text = self._stack.pop(index)
+            text = self._stack.pop(-1 - index)
         except IndexError:
             raise StackUnderflowError(_(u'Stack is empty'))
+
+        if self._listeners:
+            self._changed(len(self._stack) - index)
         return text
 
+    def pop_value(self):
+        """
+        Pop operation argument: value on top of the stack, operations
+        on top of the stack are evaluated first
+        """
+        stack = self._stack
+        if not stack or isinstance(stack[-1], function) or self._opstack:
+            return self.pop_op()
+
+        data = stack.pop()
+        if self._listeners:
+            self._changed(len(stack))
+        return data
+
     def push(self, data, index=0):
         """
         Push value into stack
         """
-        self._stack.insert(index, self.norm(data))
+        stack = self._stack
+        if index:
+            position = max(len(stack) - index, 0)
+            stack.insert(position, self.norm(data))
+        else:
+            position = len(stack)
+            stack.append(self.norm(data))
+
+        if self._listeners:
+            self._changed(position)
+
+    def extend(self, values):
+        """
+        Push values into stack in one go, either all values are pushed
+        or none of them
+        """
+        position = len(self._stack)
+        self._stack.extend(map(self.norm, values))
+
+        if self._listeners:
+            self._changed(position)
 
     def get(self, index=0):
         """
         Get value from stack w/o modification
         """
-        return self._stack[index]
+        return self._stack[-1 - index]
 
     def put(self, data, index=0):
         """
         Put value into stack, stack doesn't grow
         """
-        self._stack[index] = self.norm(data)
+        self._stack[-1 - index] = self.norm(data)
+
+        if self._listeners:
+            self._changed(len(self._stack) - 1 - index)
 
     def drop(self, index):
         """
         Drop value from stack
         """
-        try:
-            self._stack.pop(index)
-        except IndexError:
-            raise StackUnderflowError(_(u'Stack is empty'))
+        self.pop(index)
 
     def clear(self):
         """
@@ -87,39 +315,248 @@ class OpStack(object):
         """
         self._stack = list()
         self._opstack = list()
+        self._folds.clear()
+
+        if self._listeners:
+            self._opchanged = True
+            self._changed(0)
+
+    def state(self):
+        """
+        Get copies of stack and operations stack contents, bottom first
+        """
+        return list(self._stack), list(self._opstack)
+
+    def pending(self):
+        """
+        Get copy of operations stack contents, bottom first
+        """
+        return list(self._opstack)
+
+    def restore(self, stack, opstack=()):
+        """
+        Put normalized entries (e.g. got from state()) under current
+        stack contents, operations are restored if there are no pending
+        operations.
+        """
+        self._stack[:0] = stack
+        if not self._opstack:
+            self._opstack = list(opstack)
+
+        if self._listeners:
+            self._opchanged = True
+            self._changed(0)
+
+    def rewind(self, keep, entries, opstack=()):
+        """
+        Replace stack entries above the lowest keep ones with normalized
+        entries (bottom first) and operations stack with opstack
+        """
+        del self._stack[keep:]
+        self._stack.extend(entries)
+        self._opstack = list(opstack)
+
+        if self._listeners:
+            self._opchanged = True
+            self._changed(keep)
 
     __getitem__ = get
 
     def __setitem__(self, index, data):
         self.put(data, index)
 
+    def _shunt(self, op, output, opstack):
+        if not isinstance(op, function):
+            output.append(op)
+
+        else:
+            while opstack and cmp(op.op_prio, opstack[-1].op_prio) in op.op_asso:
+                output.append(opstack.pop())
+
+            opstack.append(op)
+
+    def _fold_op(self, op):
+        '''
+        Evaluate op on top of the stack if it's pure and its arguments
+        are values, return False if op is left unevaluated
+        '''
+        arity = getattr(op, 'op_arity', None)
+        if arity is None or not getattr(op, 'op_pure', False):
+            return False
+
+        stack = self._stack
+        base = len(stack) - arity
+        if base < 0:
+            return False
+        args = tuple(stack[base:])
+        for arg in args:
+            if isinstance(arg, function):
+                return False
+
+        # Results depend on the numeric backend too, it is changed when
+        # number of digits is changed
+        key = (op, args, tuple(map(type, args)), numeric.backend)
+        try:
+            results = self._folds.get(key)
+        except TypeError:
+            key = results = None
+
+        if results is not None:
+            del stack[base:]
+            stack.extend(results)
+            if self._listeners:
+                self._changed(base)
+            self.reused += 1
+            return True
+
+        try:
+            op(self)
+        except (StackError, ValueError, ArithmeticError, TypeError):
+            # Errors are reported when the expression is evaluated
+            del stack[base:]
+            stack.extend(args)
+            if self._listeners:
+                self._changed(base)
+            return False
+
+        # Signed zeros compare equal, while results for them may
+        # differ (e.g. atg2), so results for zeros are not reused
+        if key is not None and all(args):
+            self._folds[key] = tuple(stack[base:])
+        self.folded += 1
+        return True
+
+    def _fold(self, position):
+        '''
+        Fold operations moved above position of the stack by push_op()
+        '''
+        stack = self._stack
+        ops = stack[position:]
+        del stack[position:]
+
+        # Pending operations are set aside, otherwise pop_value() would
+        # evaluate them along with folded ones
+        opstack, self._opstack = self._opstack, list()
+        self._depth += 1
+        try:
+            for i, op in enumerate(ops):
+                if not self._fold_op(op):
+                    stack.extend(ops[i:])
+                    break
+        finally:
+            self._depth -= 1
+            self._opstack = opstack
+
     def push_op(self, opname):
         op = self.norm(opname)
+        position = len(self._stack)
+        self._shunt(op, self._stack, self._opstack)
+        if self._folding and isinstance(op, function) and len(self._stack) > position:
+            self._fold(position)
+            position = min(position, len(self._stack))
 
-        if not isinstance(op, function):
-            self._stack.insert(0, op)
+        if self._listeners:
+            if isinstance(op, function):
+                self._opchanged = True
+            self._changed(position)
 
-        else:
-            while self._opstack and cmp(op.op_prio, self._opstack[0].op_prio) in op.op_asso:
-                self._stack.insert(0, self._opstack.pop(0))
+    def compile(self, tokens, names=()):
+        """
+        Compile a sequence of tokens into a reusable postfix Program,
+        tokens listed in names become variables bound on execution
+
+        >>> from procalc.operations import __ops__
+        >>> stack = OpStack(int, *__ops__)
+        >>> program = stack.compile('x * 2 + 1'.split(), ('x',))
+        >>> [stack.execute(program, dict(x=x)) for x in range(4)]
+        [1, 3, 5, 7]
+
+        Pending operations are left for later:
+
+        >>> stack.push_op('3'); stack.push_op('+')
+        >>> stack.execute(program, dict(x=5))
+        11
+        >>> stack.as_str()
+        '[+]\\n3'
+        """
+        code, opstack, slots = list(), list(), list()
+
+        for token in tokens:
+            if token in names:
+                slots.append((len(code), token))
+                code.append(None)
+            else:
+                self._shunt(self.norm(token), code, opstack)
+
+        opstack.reverse()
+        code.extend(opstack)
+        return Program(code, slots)
+
+    def execute(self, program, bindings=None):
+        """
+        Execute compiled program on top of the stack, return its result
+        """
+        self._stack.extend(program.bind(self.norm, bindings))
 
-            self._opstack.insert(0, op)
+        # Pending operations are set aside, otherwise pop_value() would
+        # evaluate them along with the program
+        opstack, self._opstack = self._opstack, list()
+        try:
+            return self._eval()
+        finally:
+            self._opstack = opstack
 
     def pop_op(self):
-        while self._opstack:
-            self._stack.insert(0, self._opstack.pop(0))
+        self._folds.clear()
+        opstack = self._opstack
+        if opstack:
+            opstack.reverse()
+            self._stack.extend(opstack)
+            del opstack[:]
+            self._opchanged = True
+
+        return self._eval()
 
+    def _eval(self):
+        if self._listeners:
+            return self._eval_tracked()
+
+        stack = self._stack
         try:
-            data = self._stack.pop(0)
+            data = stack.pop()
             while isinstance(data, function):
                 data(self)
-                data = self._stack.pop(0)
+                data = stack.pop()
 
         except IndexError:
             raise StackUnderflowError(_(u'Stack is empty'))
 
         return data
 
+    def _eval_tracked(self):
+        '''
+        Same as _eval(), but track changes and notify listeners
+        once the outermost evaluation is over
+        '''
+        stack = self._stack
+        self._depth += 1
+        try:
+            data = stack.pop()
+            while isinstance(data, function):
+                if len(stack) < self._low:
+                    self._low = len(stack)
+                data(self)
+                data = stack.pop()
+
+        except IndexError:
+            raise StackUnderflowError(_(u'Stack is empty'))
+
+        finally:
+            self._depth -= 1
+            self._changed(len(stack))
+
+        return data
+
     def __iter__(self):
         '''
         >>> stack = OpStack()
@@ -132,7 +569,7 @@ class OpStack(object):
         (2, '2')
         (3, '3')
         '''
-        return enumerate(self._stack)
+        return enumerate(reversed(self._stack))
 
     def __len__(self):
         return len(self._stack)
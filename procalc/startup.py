@@ -0,0 +1,101 @@
+# coding: utf-8
+"""
+Staged application startup.
+
+Stages needed to show the window run at once, the rest are deferred
+and run one by one from idle callbacks after the window is shown.
+With timing enabled every stage is timed and the report is written
+once the last stage is over:
+
+>>> import sys
+>>> startup = Startup(timing=True, output=sys.stdout)
+>>> startup.run('window', lambda: None)
+>>> startup.defer('menu', lambda: None)
+>>> startup.idle() # doctest: +ELLIPSIS
+startup: window ... ms
+startup: menu (idle) ... ms
+startup: total ... ms
+False
+
+A deferred stage which fails is reported, the stages after it still
+run:
+
+>>> startup = Startup(output=sys.stdout)
+>>> startup.defer('dbus', lambda: 1 / 0)
+>>> startup.defer('menu', lambda: None)
+>>> startup.idle() # doctest: +ELLIPSIS
+startup: dbus (idle) failed
+Traceback (most recent call last):
+...
+ZeroDivisionError: integer division or modulo by zero
+True
+>>> startup.idle()
+False
+
+Timing is enabled by PROCALC_STARTUP_TIMING environment variable.
+"""
+
+import os
+import sys
+import time
+import traceback
+
+TIMING_ENV = 'PROCALC_STARTUP_TIMING'
+
+class Startup(object):
+
+    def __init__(self, timing=None, started=None, output=sys.stderr):
+        if timing is None:
+            timing = bool(os.environ.get(TIMING_ENV))
+
+        self.timing = timing
+        self.output = output
+        self.started = started or time.time()
+        self.stages = list()
+        self.pending = list()
+
+    def run(self, name, func):
+        '''
+        Run startup stage now
+        '''
+        if not self.timing:
+            return func()
+
+        start = time.time()
+        try:
+            return func()
+        finally:
+            self.stages.append((name, time.time() - start))
+
+    def defer(self, name, func):
+        '''
+        Run startup stage from idle callback
+        '''
+        self.pending.append((name + ' (idle)', func))
+
+    def idle(self):
+        '''
+        Idle callback: run next deferred stage, return True while
+        there are more stages to run
+        '''
+        if self.pending:
+            name, func = self.pending.pop(0)
+            # Exception would unregister the idle callback and leave
+            # the rest of stages not run
+            try:
+                self.run(name, func)
+            except Exception:
+                self.output.write('startup: %s failed\n' % name)
+                traceback.print_exc(file=self.output)
+
+        if self.pending:
+            return True
+
+        if self.timing:
+            self.report()
+        return False
+
+    def report(self):
+        for name, seconds in self.stages:
+            self.output.write('startup: %-24s %8.1f ms\n' % (name, seconds * 1000))
+        self.output.write('startup: %-24s %8.1f ms\n' % ('total', (time.time() - self.started) * 1000))
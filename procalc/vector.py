@@ -0,0 +1,139 @@
+# coding: utf-8
+"""
+Array evaluation mode.
+
+Stack entries may be NumPy arrays, operations are dispatched to NumPy
+ufuncs and list operations to NumPy reductions, so one expression is
+evaluated over all array elements in a single pass:
+
+>>> from procalc import operations, vector
+>>> from procalc.converters import Converter
+>>> from procalc.stack import OpStack
+>>> conv = Converter()
+>>> stack = OpStack(vector.guard(conv.parse), *(operations.__ops__ + vector.__ops__))
+>>> program = stack.compile('x * 2 + 1'.split(), ('x',))
+>>> stack.execute(program, dict(x=numpy.arange(4)))
+array([1, 3, 5, 7])
+>>> print vector.formatter(conv)(stack.execute(program, dict(x=numpy.arange(100))))
+[1, 3, 5, …, 195, 197, 199]
+
+Requires NumPy.
+"""
+from __future__ import division
+
+import numpy
+
+from procalc.operations import operation, operation_for_list, OP_ASSOC_RIGHT
+
+__ops__ = []
+
+array = numpy.asarray
+
+def integer(x):
+    x = numpy.asarray(x)
+    if x.dtype.kind in 'iu':
+        return x
+    return x.astype(numpy.int64)
+
+def concat(args):
+    return numpy.concatenate([numpy.ravel(a) for a in args])
+
+def guard(parse):
+    '''
+    Wrap stack guard to let arrays and NumPy scalars on the stack as is.
+    '''
+    def wrapper(value):
+        if isinstance(value, (numpy.ndarray, numpy.generic)):
+            return value
+        return parse(value)
+    return wrapper
+
+def formatter(conv, edgeitems=3):
+    '''
+    Make formatter for scalars and arrays, large arrays are summarized
+    to edgeitems first and last elements.
+    '''
+    def format_item(x):
+        return conv.format(x.item() if isinstance(x, numpy.generic) else x)
+
+    def format(x):
+        if not isinstance(x, numpy.ndarray):
+            return format_item(x)
+
+        x = numpy.ravel(x)
+        if x.size > 2 * edgeitems:
+            items = [format_item(i) for i in x[:edgeitems]] + ['…'] + [format_item(i) for i in x[-edgeitems:]]
+        else:
+            items = [format_item(i) for i in x]
+        return '[' + ', '.join(items) + ']'
+
+    return format
+
+
+@operation_for_list('Σ', -2, array, ops=__ops__)
+def op_sum(*args):
+    return numpy.sum(concat(args))
+
+@operation_for_list('Π', -1, array, ops=__ops__)
+def op_prod(*args):
+    return numpy.prod(concat(args))
+
+@operation_for_list('μ', -3, array, ops=__ops__)
+def op_mean(*args):
+    return numpy.mean(concat(args))
+
+@operation_for_list('gμ', -3, array, ops=__ops__)
+def op_gmean(*args):
+    return numpy.exp(numpy.mean(numpy.log(concat(args))))
+
+@operation_for_list('σ', -3, array, ops=__ops__)
+def op_stdev(*args):
+    return numpy.std(concat(args))
+
+
+op_add = operation('+', 1, array, array, ops=__ops__)(numpy.add)
+op_sub = operation('−', 1, array, array, ops=__ops__)(numpy.subtract)
+op_mul = operation('*', 2, array, array, ops=__ops__)(numpy.multiply)
+op_div = operation('/', 2, array, array, ops=__ops__)(numpy.true_divide)
+op_mod = operation('%', 2, integer, integer, ops=__ops__)(numpy.mod)
+op_pow = operation('↑', 3, array, array, assoc=OP_ASSOC_RIGHT, ops=__ops__)(numpy.power)
+
+op_xor = operation('^', 2, integer, integer, ops=__ops__)(numpy.bitwise_xor)
+op_or = operation('|', 2, integer, integer, ops=__ops__)(numpy.bitwise_or)
+op_and = operation('&', 2, integer, integer, ops=__ops__)(numpy.bitwise_and)
+op_not = operation('~', 4, integer, ops=__ops__)(numpy.invert)
+
+@operation('&~', 2, integer, integer, ops=__ops__)
+def op_andnot(a, b):
+    return a & ~b
+
+@operation('>>', 2, integer, integer, ops=__ops__)
+def op_shr(a, b):
+    return numpy.where(b >= 0, numpy.right_shift(a, abs(b)), numpy.left_shift(a, abs(b)))
+
+@operation('<<', 2, integer, integer, ops=__ops__)
+def op_shl(a, b):
+    return numpy.where(b >= 0, numpy.left_shift(a, abs(b)), numpy.right_shift(a, abs(b)))
+
+@operation('1/x', 2, array, ops=__ops__)
+def op_inv(a):
+    return numpy.true_divide(1, a)
+
+op_sin = operation('sin', 5, array, ops=__ops__)(numpy.sin)
+op_asin = operation('asin', 5, array, ops=__ops__)(numpy.arcsin)
+op_sinh = operation('sinh', 5, array, ops=__ops__)(numpy.sinh)
+
+op_cos = operation('cos', 5, array, ops=__ops__)(numpy.cos)
+op_acos = operation('acos', 5, array, ops=__ops__)(numpy.arccos)
+op_cosh = operation('cosh', 5, array, ops=__ops__)(numpy.cosh)
+
+op_tan = operation('tan', 5, array, ops=__ops__)(numpy.tan)
+op_atan = operation('atan', 5, array, ops=__ops__)(numpy.arctan)
+op_tanh = operation('tanh', 5, array, ops=__ops__)(numpy.tanh)
+
+op_cot = operation('cot', 5, array, ops=__ops__)(lambda a: 1 / numpy.tan(a))
+op_acot = operation('acot', 5, array, ops=__ops__)(lambda a: numpy.arctan(numpy.true_divide(1, a)))
+op_atan2 = operation('atg2', 5, array, array, ops=__ops__)(numpy.arctan2)
+
+op_log = operation('log', 5, array, integer, ops=__ops__)(lambda a, b: numpy.log(a) / numpy.log(b))
+op_ln = operation('ln', 5, array, ops=__ops__)(numpy.log)
@@ -0,0 +1,221 @@
+# coding: utf-8
+"""
+Incremental stack view.
+
+View listens to stack change events and patches only affected lines.
+Every stack entry is formatted once, formatted strings are cached
+until the formatter changes (i.e. base, mode or precision change):
+
+>>> from procalc.stack import OpStack
+>>> from procalc.operations import __ops__
+>>> stack = OpStack(int, *__ops__)
+>>> view = StackView(stack, str)
+>>> stack.push(1); stack.push(2); stack.push(3)
+>>> view.lines
+['3', '2', '1']
+>>> stack.push_op('*'); stack.push_op(4)
+>>> view.lines
+['[*]', '4', '3', '2', '1']
+>>> stack.pop_op()
+12
+>>> view.lines
+['2', '1']
+"""
+
+from procalc.i18n import _
+from procalc.stack import STACK_INSERT, STACK_REMOVE, STACK_REPLACE, STACK_OPS
+
+class StackView(object):
+    '''
+    Stack view as a list of text lines: operations stack line (if any)
+    followed by stack entries from the top down.
+
+    format is called for every new stack entry, version (if given) is
+    called on every change, formatted entries are dropped as soon as
+    it returns a new value.  If limit is given, only that many entries
+    from the top are shown, followed by a line with the number of the
+    entries left out.  Subclasses override line methods to render
+    changed lines.
+    '''
+
+    def __init__(self, stack, format, version=None, limit=None):
+        self._stack = stack
+        self._format = format
+        self._version = version or (lambda: None)
+        self._current = self._version()
+        self._limit = limit
+
+        # Formatted shown stack entries, top of the stack at the end
+        self._cache = list()
+        self._ops = ''
+        self._more = ''
+
+        self.rebuild()
+        stack.connect(self.changed)
+
+    @property
+    def lines(self):
+        lines = self._cache[::-1]
+        if self._ops:
+            lines.insert(0, self._ops)
+        if self._more:
+            lines.append(self._more)
+        return lines
+
+    def entry(self, item):
+        return getattr(item, 'op_name', None) or self._format(item) or ''
+
+    def shown(self):
+        '''
+        Number of stack entries to show
+        '''
+        if self._limit is None:
+            return len(self._stack)
+        return min(len(self._stack), self._limit)
+
+    def more(self):
+        '''
+        Line about stack entries left out
+        '''
+        hidden = len(self._stack) - self.shown()
+        if hidden:
+            return (_(u'… %d more') % hidden).encode('utf-8')
+        return ''
+
+    def rebuild(self):
+        '''
+        Format all shown stack entries and replace all lines
+        '''
+        self._current = self._version()
+        self._ops = self._stack.ops_as_str()
+        self._cache = [self.entry(self._stack.get(i)) for i in xrange(self.shown())]
+        self._cache.reverse()
+        self._more = self.more()
+        self.set_lines(self.lines)
+
+    def refresh(self):
+        '''
+        Reformat all entries if formatter has changed
+        '''
+        if self._version() != self._current:
+            self.rebuild()
+
+    def changed(self, changes):
+        # Rebuild is cheaper than patching when most lines are touched
+        if self._version() != self._current or 2 * len(changes) > len(self._stack):
+            return self.rebuild()
+
+        # Shown entries are kept to be the top entries of the stack as
+        # it is after every change, changes below them are skipped.
+        cache, stack, limit = self._cache, self._stack, self._limit
+        for event, index in changes:
+            offset = int(bool(self._ops))
+
+            if event == STACK_INSERT:
+                if index > len(cache) or limit is not None and index >= limit:
+                    continue
+                text = self.entry(stack.get(index))
+                cache.insert(len(cache) - index, text)
+                self.insert_line(index + offset, text)
+                if limit is not None and len(cache) > limit:
+                    del cache[0]
+                    self.remove_line(limit + offset)
+
+            elif event == STACK_REMOVE:
+                if index >= len(cache):
+                    continue
+                del cache[-1 - index]
+                self.remove_line(index + offset)
+
+            elif event == STACK_REPLACE:
+                if index >= len(cache):
+                    continue
+                text = self.entry(stack.get(index))
+                if cache[-1 - index] != text:
+                    cache[-1 - index] = text
+                    self.replace_line(index + offset, text)
+
+            elif event == STACK_OPS:
+                ops = stack.ops_as_str()
+                if ops and self._ops:
+                    self.replace_line(0, ops)
+                elif ops:
+                    self.insert_line(0, ops)
+                elif self._ops:
+                    self.remove_line(0)
+                self._ops = ops
+
+        # Fill the gap left by removed entries
+        offset = int(bool(self._ops))
+        while len(cache) < self.shown():
+            text = self.entry(stack.get(len(cache)))
+            self.insert_line(len(cache) + offset, text)
+            cache.insert(0, text)
+
+        more = self.more()
+        if more != self._more:
+            line = len(cache) + offset
+            if more and self._more:
+                self.replace_line(line, more)
+            elif more:
+                self.insert_line(line, more)
+            else:
+                self.remove_line(line)
+            self._more = more
+
+    def set_lines(self, lines):
+        pass
+
+    def insert_line(self, line, text):
+        pass
+
+    def remove_line(self, line):
+        pass
+
+    def replace_line(self, line, text):
+        pass
+
+class TextBufferView(StackView):
+    '''
+    Stack view rendered into gtk.TextBuffer, one line per stack entry
+    '''
+
+    def __init__(self, stack, buffer, format, version=None, limit=None):
+        self._buffer = buffer
+        self._count = 0
+        super(TextBufferView, self).__init__(stack, format, version, limit)
+
+    def _line_end(self, line):
+        end = self._buffer.get_iter_at_line(line)
+        if not end.ends_line():
+            end.forward_to_line_end()
+        return end
+
+    def set_lines(self, lines):
+        self._count = len(lines)
+        self._buffer.set_text('\n'.join(lines))
+
+    def insert_line(self, line, text):
+        buffer = self._buffer
+        if not self._count:
+            buffer.set_text(text)
+        elif line < self._count:
+            buffer.insert(buffer.get_iter_at_line(line), text + '\n')
+        else:
+            buffer.insert(buffer.get_end_iter(), '\n' + text)
+        self._count += 1
+
+    def remove_line(self, line):
+        buffer = self._buffer
+        if self._count == 1:
+            buffer.set_text('')
+        elif line < self._count - 1:
+            buffer.delete(buffer.get_iter_at_line(line), buffer.get_iter_at_line(line + 1))
+        else:
+            buffer.delete(self._line_end(line - 1), buffer.get_end_iter())
+        self._count -= 1
+
+    def replace_line(self, line, text):
+        buffer = self._buffer
+        buffer.delete(buffer.get_iter_at_line(line), self._line_end(line))
+        buffer.insert(buffer.get_iter_at_line(line), text)
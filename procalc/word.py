@@ -0,0 +1,71 @@
+# coding: utf-8
+"""
+Fixed width integers.
+
+Word wraps integers to a fixed number of bits, signed (two's
+complement) or unsigned, with masks precomputed for the width:
+
+>>> word = word_for('int8')
+>>> word.wrap(127 + 1), word.wrap(-129), word.unsigned(-1)
+(-128, 127, 255)
+>>> word_for('uint16').wrap(-1)
+65535
+>>> word_for('') is None
+True
+"""
+
+from procalc.i18n import _
+
+WORD_BITS = (8, 16, 32, 64, 128)
+
+WORD_NAMES = tuple(('int%d' % bits) for bits in WORD_BITS) + tuple(('uint%d' % bits) for bits in WORD_BITS)
+
+class WordError(ValueError):
+    pass
+
+class Word(object):
+
+    def __init__(self, bits, signed=True):
+        self.bits = bits
+        self.signed = signed
+        self.name = ('int%d' if signed else 'uint%d') % bits
+        self.mask = mask = (1 << bits) - 1
+
+        if signed:
+            offset = 1 << (bits - 1)
+            self.min, self.max = -offset, offset - 1
+            self.wrap = lambda x: ((x + offset) & mask) - offset
+        else:
+            self.min, self.max = 0, mask
+            self.wrap = lambda x: x & mask
+
+    def unsigned(self, x):
+        '''
+        Bits of x as unsigned integer
+        '''
+        return x & self.mask
+
+    def __repr__(self):
+        return '<Word %s>' % self.name
+
+words = dict()
+
+def word_for(name):
+    '''
+    Get shared Word by name (int8 .. uint128), empty name means
+    unbounded integers (None)
+    '''
+    if not name:
+        return None
+
+    try:
+        return words[name]
+    except KeyError:
+        pass
+
+    if name not in WORD_NAMES:
+        raise WordError(_(u'Unknown word size %s') % name)
+
+    signed = not name.startswith('u')
+    word = words[name] = Word(int(name[3 if signed else 4:]), signed)
+    return word